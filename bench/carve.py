@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from synthetic import build_image
+
+LAWLIET = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core', 'lawliet.py')
+
+# usage: python3 bench/carve.py [size in MB] [--seed N] [-b buffer MB] [--workers N] [--mmap] [--image path]
+# carves a synthetic image (see synthetic.py) with core/lawliet.py and reports the speed, the peak memory and how many
+# of the planted files came back byte for byte (recall) and how many of the recovered files are planted ones (precision)
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024*1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def recovered_files(outpath):
+    # extension -> sha-256 of every recovered file (the manifest and the checkpoint are not in a format directory)
+    recovered = {}
+    for folder in sorted(os.listdir(outpath)):
+        if os.path.isdir(os.path.join(outpath, folder)):
+            for name in sorted(os.listdir(os.path.join(outpath, folder))):
+                extension = os.path.splitext(name)[1][1:]
+                recovered.setdefault(extension, []).append(sha256(os.path.join(outpath, folder, name)))
+    return recovered
+
+
+def process_tree(pid):
+    # pid and its descendants (the scanning workers), from the parents in /proc/<pid>/stat
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                pass
+    tree = [pid]
+    for process in tree:
+        tree += [child for child, parent in parents.items() if parent == process]
+    return tree
+
+
+def peak_rss(pid):
+    # VmHWM, the peak resident memory of the process in KB, None once it is gone
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def run(command):
+    # runs the carve and returns the sum of the peak RSS of its processes in KB: getrusage(RUSAGE_CHILDREN) only has
+    # the biggest one, a carve with --workers N uses about N times that. The tree is sampled while it runs, a worker
+    # living less than a sample is missed (without /proc there is only the biggest process)
+    process = subprocess.Popen(command)
+    peaks = {}
+    while process.poll() is None:
+        if os.path.isdir('/proc'):
+            for pid in process_tree(process.pid):
+                peak = peak_rss(pid)
+                if peak is not None:
+                    peaks[pid] = max(peaks.get(pid, 0), peak)
+        time.sleep(0.05)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return max(sum(peaks.values()), resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) #KB on linux
+
+
+def score(truth, recovered):
+    # recall only counts the contiguous files, a header/footer carver can't put fragments back together
+    planted = {}
+    for file in truth['files']:
+        if len(file['fragments']) == 1:
+            planted.setdefault(file['sha256'], file['format'])
+    found = {digest for digests in recovered.values() for digest in digests}
+    formats = {}
+    for digest, format in planted.items():
+        counts = formats.setdefault(format, {'planted': 0, 'recovered': 0, 'false': 0})
+        counts['planted'] += 1
+        counts['recovered'] += digest in found
+    for format, digests in recovered.items():
+        counts = formats.setdefault(format, {'planted': 0, 'recovered': 0, 'false': 0})
+        counts['false'] += sum(1 for digest in digests if digest not in planted)
+    total = sum(len(digests) for digests in recovered.values())
+    hits = sum(counts['recovered'] for counts in formats.values())
+    return {
+        'planted': len(planted),
+        'fragmented': len(truth['files']) - len(planted),
+        'recovered': total,
+        'recall': round(hits / len(planted), 4) if planted else 1.0,
+        'precision': round(sum(1 for digests in recovered.values() for digest in digests if digest in planted) / total, 4) if total else 1.0,
+        'formats': formats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carving benchmark on a synthetic image with known files")
+    parser.add_argument("size", type=int, nargs='?', default=256, help="Image size in MB (default: 256)")
+    parser.add_argument("--seed", type=int, default=1337, help="Seed of the image (default: 1337)")
+    parser.add_argument("--decoys", type=float, default=0.5, help="Decoy headers per MB of image (default: 0.5)")
+    parser.add_argument("-b", type=int, default=8, help="Buffer size in MB (default: 8)")
+    parser.add_argument("--workers", type=int, default=1, help="Scanning processes (default: 1)")
+    parser.add_argument("--mmap", action="store_true", help="Scan a memory mapping of the image")
+    parser.add_argument("--image", help="Image to reuse (or to create) with its .truth.json, instead of a temporary one")
+    parser.add_argument("--keep", action="store_true", help="Keep the recovered files and print where they are")
+    parser.add_argument("--json", action="store_true", help="Print the results as json")
+    parser.add_argument("--min-recall", type=float, default=0.0, help="Exit with an error below this recall")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="lawliet-bench-")
+    image = args.image or os.path.join(workdir, "synthetic.dd")
+    if os.path.exists(image + ".truth.json"):
+        with open(image + ".truth.json") as f:
+            truth = json.load(f)
+    else:
+        truth = build_image(image, args.size*1024*1024, args.seed, decoys_per_mb=args.decoys)
+
+    outpath = os.path.join(workdir, "recovered")
+    command = [sys.executable, LAWLIET, image, outpath, "-b", str(args.b), "--workers", str(args.workers),
+               "--log", "quiet", "--rescan", "--index-dir", os.path.join(workdir, "index")]
+    if args.mmap:
+        command.append("--mmap")
+    start = time.perf_counter()
+    peak = run(command)
+    elapsed = time.perf_counter() - start
+
+    results = score(truth, recovered_files(outpath))
+    results['size'] = truth['size']
+    results['seconds'] = round(elapsed, 2)
+    results['mb_per_s'] = round(truth['size'] / (1024*1024) / elapsed, 2)
+    results['peak_rss_mb'] = round(peak / 1024, 1) #all the processes of the carve together
+    results['peak_rss_process_mb'] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1) #the biggest one
+
+    if args.keep:
+        print(f"Recovered files kept in {outpath}")
+    else:
+        shutil.rmtree(workdir)
+
+    if args.json:
+        print(json.dumps(results, indent=1))
+    else:
+        print(f"{results['size'] // (1024*1024)}MB in {results['seconds']}s: {results['mb_per_s']} MB/s, "
+              f"peak RSS {results['peak_rss_mb']}MB (all processes, {results['peak_rss_process_mb']}MB for the biggest)")
+        print(f"recall {results['recall']:.2%} ({results['planted']} contiguous files, {results['fragmented']} fragmented not counted), "
+              f"precision {results['precision']:.2%} ({results['recovered']} files recovered)")
+        for format, counts in sorted(results['formats'].items()):
+            print(f"  {format:>5}: {counts['recovered']}/{counts['planted']} recovered, {counts['false']} false positives")
+    if results['recall'] < args.min_recall:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+from signatures import SIGNATURES
+from scanner import Scanner
+
+# usage: python3 bench/scan_throughput.py "image size (in MB)" "buffer size (in MB)"
+# compares the old per-format data.find loops of carve() with the single-pass Scanner on a synthetic image
+
+
+def make_image(size, seed=1337):
+    rng = random.Random(seed) #fixed seed so every run scans exactly the same bytes
+    image = bytearray(rng.randbytes(size))
+    headers = [SIGNATURES[format]['header'] for format in SIGNATURES]
+    for _ in range(size // (64*1024)): #one planted header every 64KB on average
+        header = rng.choice(headers)
+        position = rng.randrange(0, size - len(header))
+        image[position:position + len(header)] = header
+    return bytes(image)
+
+
+def legacy_scan(data):
+    hits = []
+    for format in SIGNATURES: #this is what carve() did before: one full pass over the buffer per format
+        position = data.find(SIGNATURES[format]['header'])
+        while position != -1:
+            hits.append((position, format))
+            position = data.find(SIGNATURES[format]['header'], position + 1)
+    return hits
+
+
+def bench(name, scan, image, buffer_size, rounds=3):
+    best = None
+    for _ in range(rounds):
+        found = 0
+        start = time.perf_counter()
+        for offset in range(0, len(image), buffer_size):
+            found += len(scan(image[offset:offset + buffer_size]))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<10} {len(image) / (1024*1024) / best:10.1f} MB/s   {found} hits")
+
+
+def main():
+    image_size = int(sys.argv[1])*1024*1024 if len(sys.argv) > 1 else 256*1024*1024
+    buffer_size = int(sys.argv[2])*1024*1024 if len(sys.argv) > 2 else 8*1024*1024
+    image = make_image(image_size)
+    scanner = Scanner(SIGNATURES)
+    print(f"image: {image_size // (1024*1024)}MB, buffer: {buffer_size // (1024*1024)}MB")
+    bench("before", legacy_scan, image, buffer_size)
+    bench("after", scanner.scan, image, buffer_size)
+
+
+if __name__ == "__main__":
+    main()
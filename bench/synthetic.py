@@ -0,0 +1,219 @@
+import io
+import os
+import sys
+import json
+import math
+import zlib
+import random
+import struct
+import hashlib
+import zipfile
+
+# usage: python3 bench/synthetic.py "output image" "image size (in MB)" [seed]
+# builds a deterministic disk image: random noise, known files planted at sector offsets (some of them across
+# buffer boundaries, some split in two fragments) and decoy headers, plus "<image>.truth.json" with where
+# every planted file is and its sha-256, so a carve of the image can be scored against it
+
+SECTOR = 512 #files start on sector boundaries, like on a real filesystem
+NOISE_CHUNK = 4*1024*1024
+BOUNDARY_BUFFER = 8*1024*1024 #buffer size the boundary-crossing files are placed for (the default -b 8)
+
+# (smallest, biggest) size of the generated files by extension, the sizes in between are log-uniform
+SIZES = {
+    'jpg': (8*1024, 3*1024*1024),
+    'png': (2*1024, 1024*1024),
+    'gif': (1024, 512*1024),
+    'pdf': (4*1024, 2*1024*1024),
+    'zip': (4*1024, 2*1024*1024),
+    'docx': (4*1024, 512*1024),
+    'xlsx': (4*1024, 512*1024),
+    'pptx': (4*1024, 512*1024),
+    'mp4': (64*1024, 8*1024*1024),
+}
+
+# headers without a file behind them, like the leftovers of deleted or overwritten files
+DECOYS = [b'\xff\xd8\xff\xe0', b'\x89PNG\r\n\x1a\n', b'GIF89a', b'%PDF', b'PK\x03\x04', b'ftypisom']
+
+
+def make_jpeg(rng, size):
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+    dqt = b'\xff\xdb' + struct.pack('>HB', 67, 0) + rng.randbytes(64)
+    sof = b'\xff\xc0' + struct.pack('>HBHHB', 17, 8, 1024, 768, 3) + b'\x01\x22\x00\x02\x11\x01\x03\x11\x01'
+    sos = b'\xff\xda' + struct.pack('>HB', 12, 3) + b'\x01\x00\x02\x11\x03\x11\x00\x3f\x00'
+    scan = rng.randbytes(size).replace(b'\xff', b'\xff\x00') #byte stuffing, like a real encoder
+    return b'\xff\xd8' + app0 + dqt + sof + sos + scan + b'\xff\xd9'
+
+
+def make_png(rng, size):
+    def chunk(chunk_type, data):
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+    png = [b'\x89PNG\r\n\x1a\n', chunk(b'IHDR', struct.pack('>IIBBBBB', 1024, 768, 8, 2, 0, 0, 0))]
+    left = size
+    while left > 0:
+        idat = min(left, 64*1024)
+        png.append(chunk(b'IDAT', rng.randbytes(idat)))
+        left -= idat
+    png.append(chunk(b'IEND', b''))
+    return b''.join(png)
+
+
+def make_gif(rng, size):
+    gif = [b'GIF89a' + struct.pack('<HHBBB', 640, 480, 0xf7, 0, 0) + rng.randbytes(3*256)]
+    gif.append(b'\x2c' + struct.pack('<HHHHB', 0, 0, 640, 480, 0) + b'\x08')
+    for _ in range(max(1, size // 255)):
+        gif.append(b'\xff' + rng.randbytes(255))
+    gif.append(b'\x00\x3b')
+    return b''.join(gif)
+
+
+def make_pdf(rng, size):
+    stream = rng.randbytes(size).replace(b'%%EOF', b'%%EOX') #the carver stops at the first %%EOF
+    return (b'%PDF-1.7\n1 0 obj\n<< /Length ' + str(len(stream)).encode() + b' /Filter /FlateDecode >>\nstream\n'
+            + stream + b'\nendstream\nendobj\ntrailer\n<< /Root 1 0 R >>\n%%EOF') #no end of line after %%EOF, it is optional
+
+
+def make_zip(rng, size):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as z:
+        left = size
+        n = 0
+        while left > 0:
+            part = min(left, rng.randrange(1024, 256*1024))
+            if n % 2:
+                z.writestr(f"data/file_{n}.bin", rng.randbytes(part), compress_type=zipfile.ZIP_STORED)
+            else:
+                text = " ".join(rng.choice(("lorem", "ipsum", "dolor", "sit", "amet")) for _ in range(part // 6))
+                z.writestr(f"text/file_{n}.txt", text, compress_type=zipfile.ZIP_DEFLATED)
+            left -= part
+            n += 1
+    return archive.getvalue()
+
+
+OOXML = {
+    'docx': ('word/document.xml', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml'),
+    'xlsx': ('xl/workbook.xml', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml'),
+    'pptx': ('ppt/presentation.xml', 'application/vnd.openxmlformats-officedocument.presentationml.presentation.main+xml'),
+}
+
+
+def make_ooxml(rng, size, kind):
+    part, content_type = OOXML[kind]
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('[Content_Types].xml', f'<?xml version="1.0"?><Types><Override PartName="/{part}" ContentType="{content_type}"/></Types>')
+        z.writestr(part, '<?xml version="1.0"?><root>' + 'x' * 64 + '</root>')
+        z.writestr(os.path.dirname(part) + '/media/image1.bin', rng.randbytes(size), compress_type=zipfile.ZIP_STORED)
+    return archive.getvalue()
+
+
+def make_mp4(rng, size):
+    def box(name, data):
+        return struct.pack('>I', 8 + len(data)) + name + data
+    ftyp = box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2avc1mp41')
+    moov = box(b'moov', box(b'mvhd', b'\x00' * 100) + box(b'trak', box(b'tkhd', b'\x00' * 84)))
+    return ftyp + moov + box(b'free', b'') + box(b'mdat', rng.randbytes(size))
+
+
+MAKERS = {
+    'jpg': make_jpeg,
+    'png': make_png,
+    'gif': make_gif,
+    'pdf': make_pdf,
+    'zip': make_zip,
+    'docx': lambda rng, size: make_ooxml(rng, size, 'docx'),
+    'xlsx': lambda rng, size: make_ooxml(rng, size, 'xlsx'),
+    'pptx': lambda rng, size: make_ooxml(rng, size, 'pptx'),
+    'mp4': make_mp4,
+}
+
+
+def align(offset):
+    return (offset + SECTOR - 1) // SECTOR * SECTOR
+
+
+def build_image(path, size, seed=1337, buffer_size=BOUNDARY_BUFFER, files_per_mb=1.0, boundary_ratio=0.2,
+                fragmented_ratio=0.05, decoys_per_mb=0.5):
+    # writes the image and returns its ground truth (also saved as path + ".truth.json")
+    rng = random.Random(seed)
+    files = []
+    gaps = [] #(start, end) of the noise between the files, where the decoys go
+    cursor = 0
+    mean_gap = max(SECTOR, int(1024*1024 / files_per_mb))
+    while True:
+        format = rng.choice(list(MAKERS))
+        low, high = SIZES[format]
+        high = max(low, min(high, size // 8))
+        payload = int(math.exp(rng.uniform(math.log(low), math.log(high))))
+        data = MAKERS[format](rng, payload)
+
+        start = align(cursor + rng.randrange(0, 2 * mean_gap))
+        if rng.random() < boundary_ratio: #across the next buffer boundary, the carver must put it back together
+            boundary = (start // buffer_size + 1) * buffer_size
+            start = max(start, boundary - rng.randrange(1, len(data)))
+        fragments = [(start, len(data))]
+        if rng.random() < fragmented_ratio and len(data) > 2*SECTOR: #split in two with noise between
+            split = align(rng.randrange(SECTOR, len(data) - SECTOR))
+            second = align(start + split + rng.randrange(SECTOR, 1024*1024))
+            fragments = [(start, split), (second, len(data) - split)]
+        end = fragments[-1][0] + fragments[-1][1]
+        if end > size:
+            break
+        gaps.append((cursor, start))
+        if len(fragments) > 1:
+            gaps.append((start + fragments[0][1], fragments[1][0]))
+        files.append({
+            'format': format,
+            'offset': start,
+            'length': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'fragments': [list(fragment) for fragment in fragments],
+            'data': data,
+        })
+        cursor = end
+    gaps.append((cursor, size))
+
+    decoys = []
+    for _ in range(int(size / (1024*1024) * decoys_per_mb)):
+        gap_start, gap_end = rng.choice(gaps)
+        header = rng.choice(DECOYS)
+        if gap_end - gap_start > len(header):
+            decoys.append((rng.randrange(gap_start, gap_end - len(header)), header))
+
+    with open(path, 'wb') as f:
+        for offset in range(0, size, NOISE_CHUNK):
+            f.write(rng.randbytes(min(NOISE_CHUNK, size - offset)))
+        for offset, header in decoys:
+            f.seek(offset)
+            f.write(header)
+        for planted in files:
+            data = planted.pop('data')
+            done = 0
+            for offset, length in planted['fragments']:
+                f.seek(offset)
+                f.write(data[done:done + length])
+                done += length
+
+    truth = {
+        'size': size,
+        'seed': seed,
+        'buffer_size': buffer_size,
+        'files': files,
+        'decoys': [[offset, header.decode('latin-1')] for offset, header in decoys],
+    }
+    with open(path + ".truth.json", 'w') as f:
+        json.dump(truth, f, indent=1)
+    return truth
+
+
+def main():
+    if len(sys.argv) < 3:
+        print('usage: python3 bench/synthetic.py "output image" "image size (in MB)" [seed]')
+        sys.exit(1)
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 1337
+    truth = build_image(sys.argv[1], int(sys.argv[2])*1024*1024, seed)
+    fragmented = sum(1 for planted in truth['files'] if len(planted['fragments']) > 1)
+    print(f"{len(truth['files'])} files planted ({fragmented} fragmented), {len(truth['decoys'])} decoy headers")
+
+
+if __name__ == "__main__":
+    main()
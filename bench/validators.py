@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import zlib
+import random
+import struct
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+from validators import validate_jpeg, validate_png, validate_gif
+
+# usage: python3 bench/validators.py "file size (in MB)"
+# builds one big synthetic jpeg, png and gif and reports how fast each validator walks them
+
+
+def make_jpeg(size, rng):
+    body = rng.randbytes(size).replace(b'\xff', b'\xff\x00') #byte stuffing, like a real encoder
+    sof = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, 1024, 1024, 1) + b'\x01\x11\x00'
+    sos = b'\xff\xda' + struct.pack('>HB', 8, 1) + b'\x01\x00\x00\x3f\x00'
+    return b'\xff\xd8' + sof + sos + body + b'\xff\xd9'
+
+
+def make_png(size, rng):
+    def chunk(chunk_type, data):
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+    png = [b'\x89PNG\r\n\x1a\n', chunk(b'IHDR', struct.pack('>IIBBBBB', 1024, 1024, 8, 2, 0, 0, 0))]
+    idat = 64*1024 #encoders usually split the image data in chunks like this
+    for _ in range(size // idat):
+        png.append(chunk(b'IDAT', rng.randbytes(idat)))
+    png.append(chunk(b'IEND', b''))
+    return b''.join(png)
+
+
+def make_gif(size, rng):
+    gif = [b'GIF89a' + struct.pack('<HHBBB', 1024, 1024, 0xf7, 0, 0) + rng.randbytes(3*256)]
+    gif.append(b'\x2c' + struct.pack('<HHHHB', 0, 0, 1024, 1024, 0) + b'\x08')
+    for _ in range(size // 256):
+        gif.append(b'\xff' + rng.randbytes(255))
+    gif.append(b'\x00\x3b')
+    return b''.join(gif)
+
+
+def bench(name, validate, data, rounds=3):
+    with tempfile.TemporaryFile() as f:
+        f.write(data)
+        f.flush()
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            end = validate(f, 0, len(data))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        status = "ok" if end == len(data) else f"WRONG END {end}"
+        print(f"{name:<6} {len(data) / (1024*1024) / best:10.1f} MB/s   {status}")
+
+
+def main():
+    size = int(sys.argv[1])*1024*1024 if len(sys.argv) > 1 else 64*1024*1024
+    rng = random.Random(1337)
+    bench("jpeg", validate_jpeg, make_jpeg(size, rng))
+    bench("png", validate_png, make_png(size, rng))
+    bench("gif", validate_gif, make_gif(size, rng))
+
+
+if __name__ == "__main__":
+    main()
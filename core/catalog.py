@@ -0,0 +1,142 @@
+import os
+import time
+import sqlite3
+import threading
+from urllib.parse import quote
+
+CATALOG_NAME = "catalog.sqlite" #in the output directory, next to the recovered files
+CATALOG_BATCH = 1000 #files kept in memory before they are written
+CATALOG_INTERVAL = 1 #seconds, the files of a slow carve still show up this often
+
+COLUMNS = ("id", "path", "type", "extension", "size", "offset", "sha256", "removed")
+SORTS = ("id", "offset", "size", "type", "path") #id is the order the files were written in
+
+
+class Catalog:
+    # every file recovered in an output directory: its type, size, offset in the image and sha-256 (when the
+    # deduplication hashed it), added by the Writer as the files are written so nobody has to walk the directory.
+    # Every change gets a new id: a file written again (resume) comes back with a higher id, a file the deduplication
+    # removed comes back as removed, so a client that has everything up to an id only asks for what came after it
+    def __init__(self, root, image=None, readonly=False):
+        self.root = root
+        self.lock = threading.Lock() #the writer threads add files at the same time
+        self.pending = []
+        self.last = time.monotonic()
+        path = os.path.join(root, CATALOG_NAME)
+        if readonly: #the web api listing the files, nothing is created or written
+            self.db = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True, check_same_thread=False)
+            return
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL") #the web api reads it while a carve writes it
+        self.db.execute("""CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT UNIQUE, type TEXT, extension TEXT, size INTEGER,
+            offset INTEGER, sha256 TEXT, removed INTEGER)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS files_offset ON files (offset)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if image is not None:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('image', ?)", (os.path.abspath(image),))
+        self.db.commit()
+
+    @classmethod
+    def open(cls, root):
+        # the catalog of an output directory, one recovered before there were catalogs is filled from its files
+        new = not os.path.exists(os.path.join(root, CATALOG_NAME))
+        catalog = cls(root)
+        if new:
+            catalog.add_directory()
+        return catalog
+
+    @classmethod
+    def read(cls, root):
+        # the catalog of an output directory opened read-only, None if there is none
+        if not os.path.exists(os.path.join(root, CATALOG_NAME)):
+            return None
+        return cls(root, readonly=True)
+
+    def add_directory(self):
+        for folder in sorted(os.listdir(self.root)):
+            if os.path.isdir(os.path.join(self.root, folder)):
+                for entry in sorted(os.scandir(os.path.join(self.root, folder)), key=lambda entry: entry.name):
+                    if entry.is_file():
+                        self.add(entry.path, None, entry.stat().st_size)
+        self.flush()
+
+    @property
+    def image(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'image'").fetchone()
+        return row[0] if row is not None else None
+
+    @property
+    def last_id(self):
+        # the id of the last change, nothing changed while it stays the same
+        row = self.db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'files'").fetchone()
+        return row[0] if row is not None else 0
+
+    def add(self, path, offset, length, sha256=None):
+        self.change(path, length, offset, sha256, 0)
+
+    def remove(self, path):
+        self.change(path, None, None, None, 1)
+
+    def change(self, path, size, offset, sha256, removed):
+        path = os.path.relpath(path, self.root)
+        folder, name = os.path.split(path)
+        with self.lock:
+            self.pending.append((path, folder, os.path.splitext(name)[1][1:], size, offset, sha256, removed))
+            if len(self.pending) >= CATALOG_BATCH or time.monotonic() - self.last >= CATALOG_INTERVAL:
+                self.write()
+
+    def flush(self):
+        with self.lock:
+            self.write()
+
+    def write(self):
+        # called with the lock held, the same path again replaces the old entry with a new id
+        if self.pending:
+            self.db.executemany("""INSERT OR REPLACE INTO files (path, type, extension, size, offset, sha256, removed)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""", self.pending)
+            self.db.commit()
+            self.pending = []
+        self.last = time.monotonic()
+
+    def where(self, types=None, extensions=None, min_size=None, max_size=None):
+        query = ""
+        args = []
+        if types:
+            query += f" AND type IN ({', '.join('?' * len(types))})"
+            args += types
+        if extensions:
+            query += f" AND extension IN ({', '.join('?' * len(extensions))})"
+            args += extensions
+        if min_size is not None:
+            query += " AND (size >= ? OR removed)" #the removed files have no size, they still get through
+            args.append(min_size)
+        if max_size is not None:
+            query += " AND (size <= ? OR removed)"
+            args.append(max_size)
+        return query, args
+
+    def files(self, sort="id", descending=False, limit=None, skip=0, **filters):
+        # the files there now as dicts, filtered (see where) and sorted by one of SORTS, then by id
+        if sort not in SORTS:
+            raise ValueError(f"Cannot sort by {sort}, only by {', '.join(SORTS)}")
+        query, args = self.where(**filters)
+        order = " DESC" if descending else ""
+        rows = self.db.execute(f"SELECT {', '.join(COLUMNS)} FROM files WHERE removed = 0{query} "
+                               f"ORDER BY {sort}{order}, id{order} LIMIT ? OFFSET ?", args + [-1 if limit is None else limit, skip])
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def count(self, **filters):
+        query, args = self.where(**filters)
+        return self.db.execute(f"SELECT COUNT(*) FROM files WHERE removed = 0{query}", args).fetchone()[0]
+
+    def changes(self, since=0, limit=None, **filters):
+        # what changed after the id since, in order: new files, files written again and removed ones
+        query, args = self.where(**filters)
+        rows = self.db.execute(f"SELECT {', '.join(COLUMNS)} FROM files WHERE id > ?{query} ORDER BY id LIMIT ?",
+                               [since] + args + [-1 if limit is None else limit])
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -0,0 +1,67 @@
+import os
+import json
+import time
+
+CHECKPOINT_NAME = ".lawliet_checkpoint.json" #lives in the output directory, next to the recovered files
+CHECKPOINT_INTERVAL = 30 #seconds between two checkpoints
+
+
+def checkpoint_path(outpath):
+    return os.path.join(outpath, CHECKPOINT_NAME)
+
+
+def load_checkpoint(outpath):
+    try:
+        with open(checkpoint_path(outpath)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Checkpoint:
+    # saves how far the carve went: the offset scanned, the file counter and the files still open,
+    # so a carve that died can go on from there instead of offset 0
+    def __init__(self, outpath, isopath, totalsize, options, interval=CHECKPOINT_INTERVAL):
+        self.path = checkpoint_path(outpath)
+        self.isopath = os.path.abspath(isopath)
+        self.totalsize = totalsize
+        self.options = options #the parameters of the carve, the web resume uses them to start it again the same way
+        self.interval = interval
+        self.index = None #the token of the hit index the carve fills, a resume goes on with it (see HitIndex.reset)
+        self.last = time.monotonic()
+
+    def resume_state(self):
+        # returns the saved state if it belongs to this image, None otherwise
+        state = load_checkpoint(os.path.dirname(self.path))
+        if state is None or state['image'] != self.isopath or state['size'] != self.totalsize:
+            return None
+        return state
+
+    def due(self):
+        return time.monotonic() - self.last >= self.interval
+
+    def save(self, position, i, skip_until, open_carves):
+        # open_carves: format -> (start, search_from)
+        state = {
+            'image': self.isopath,
+            'size': self.totalsize,
+            'options': self.options,
+            'position': position,
+            'i': i,
+            'index': self.index,
+            'skip_until': skip_until,
+            'open_carves': {format: list(carving) for format, carving in open_carves.items()},
+        }
+        temporary = self.path + ".tmp"
+        with open(temporary, 'w') as f: #written aside and renamed, a crash while saving never leaves a broken checkpoint
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        self.last = time.monotonic()
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
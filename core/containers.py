@@ -0,0 +1,323 @@
+import io
+import os
+import re
+import zlib
+import struct
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from sparse import Extents, find_holes
+
+BLOCK_CACHE = 64*1024*1024 #decompressed bytes a compressed image keeps, the strategies read back into recent blocks
+BGZF_HEADER = 12 + 256 #the gzip header and enough of its extra field to find the block size
+
+SPLIT = re.compile(r'^(.*)\.(\d{3})$') #disk.001, disk.002... (or disk.000, disk.001...)
+BGZF_EXTENSIONS = ('.gz', '.bgz')
+ZSTD_EXTENSIONS = ('.zst', '.zstd')
+
+# kinds of images
+RAW = "raw" #a plain file or a device, read directly
+SPLIT_RAW = "split"
+BGZF = "bgzf"
+ZSTD = "zstd"
+
+GZIP_MAGIC = b'\x1f\x8b\x08'
+FEXTRA = 0x04
+SEEKABLE_MAGIC = 0x8F92EAB1 #end of the seek table of the zstd seekable format
+SEEK_TABLE_FOOTER = 9
+
+
+class ImageReader(io.RawIOBase):
+    # a container read as one seekable image of self.size bytes, sequentially like a file (the scan loop) or with
+    # pread(size, offset) like os.pread (the strategies and the writers, from several threads). There is no file
+    # descriptor behind it: no mmap and no kernel copies
+    def __init__(self):
+        super().__init__()
+        self.size = 0
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        data = self.pread(len(buffer), self.position)
+        with memoryview(buffer) as view:
+            view[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def holes(self):
+        # the holes of the image, see sparse.py
+        return Extents()
+
+
+class SplitImage(ImageReader):
+    # a raw image cut in segments (disk.001, disk.002...), the segments one after the other
+    def __init__(self, paths):
+        super().__init__()
+        self.fds = []
+        self.starts = []
+        try:
+            for path in paths:
+                self.fds.append(os.open(path, os.O_RDONLY))
+                self.starts.append(self.size)
+                self.size += os.fstat(self.fds[-1]).st_size
+        except OSError:
+            self.close()
+            raise
+
+    def pread(self, size, offset):
+        chunks = []
+        n = bisect_right(self.starts, offset) - 1
+        end = min(offset + size, self.size)
+        while offset < end:
+            segment_end = self.starts[n + 1] if n + 1 < len(self.starts) else self.size
+            chunk = os.pread(self.fds[n], min(end, segment_end) - offset, offset - self.starts[n])
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+            if offset >= segment_end:
+                n += 1
+        return b''.join(chunks)
+
+    def holes(self):
+        # the holes of every segment, the ones that meet at the end of a segment are one
+        extents = []
+        for start, fd in zip(self.starts, self.fds):
+            for hole_start, hole_end in find_holes(fd, os.fstat(fd).st_size).extents:
+                if extents and extents[-1][1] == start + hole_start:
+                    extents[-1] = (extents[-1][0], start + hole_end)
+                else:
+                    extents.append((start + hole_start, start + hole_end))
+        return Extents(extents)
+
+    def close(self):
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+        super().close()
+
+
+class BlockImage(ImageReader):
+    # a compressed image made of blocks compressed independently, with an index of where each one starts
+    # (self.offsets in the file, self.starts in the image): a read only decompresses the blocks it spans, and the
+    # last ones are kept (LRU) so the strategies going back a few KB to walk a structure don't decompress them again
+    def __init__(self, path, cache_size=BLOCK_CACHE):
+        super().__init__()
+        self.fd = os.open(path, os.O_RDONLY)
+        self.offsets = array('Q') #the last one is where the last block ends
+        self.starts = array('Q')
+        self.cache = OrderedDict() #block number -> decompressed data
+        self.cached = 0
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+
+    def add_block(self, offset, start):
+        self.offsets.append(offset)
+        self.starts.append(start)
+
+    def block(self, n):
+        with self.lock:
+            data = self.cache.get(n)
+            if data is not None:
+                self.cache.move_to_end(n)
+                return data
+        # decompressed without the lock, two threads may do the same block at worst
+        data = self.decompress(os.pread(self.fd, self.offsets[n + 1] - self.offsets[n], self.offsets[n]), n)
+        with self.lock:
+            if n not in self.cache:
+                self.cache[n] = data
+                self.cached += len(data)
+                while self.cached > self.cache_size and len(self.cache) > 1:
+                    self.cached -= len(self.cache.popitem(last=False)[1])
+        return data
+
+    def pread(self, size, offset):
+        chunks = []
+        n = bisect_right(self.starts, offset) - 1
+        end = min(offset + size, self.size)
+        while offset < end:
+            data = self.block(n)
+            start = offset - self.starts[n]
+            chunk = data[start:start + end - offset]
+            if not chunk:
+                raise OSError(f"block {n} of the image is shorter than its index says")
+            chunks.append(chunk)
+            offset += len(chunk)
+            n += 1
+        return b''.join(chunks)
+
+    def close(self):
+        if getattr(self, 'fd', None) is not None:
+            os.close(self.fd)
+            self.fd = None
+        super().close()
+
+
+def bgzf_block_size(header):
+    # the size of a bgzf block from its gzip header (the BSIZE of its "BC" extra field), None if it has none
+    if len(header) < 12 or header[:3] != GZIP_MAGIC or not header[3] & FEXTRA:
+        return None
+    extra_length = struct.unpack_from('<H', header, 10)[0]
+    position = 12
+    while position + 4 <= min(12 + extra_length, len(header)):
+        subfield, length = header[position:position + 2], struct.unpack_from('<H', header, position + 2)[0]
+        if subfield == b'BC' and length == 2:
+            return struct.unpack_from('<H', header, position + 4)[0] + 1
+        position += 4 + length
+    return None
+
+
+class BgzfImage(BlockImage):
+    # a gzip image made of independent blocks of at most 64KB (bgzip, samtools), each one saying its size in its
+    # header. The index is read from the .gzi bgzip -i writes next to it, or built walking the block headers
+    def __init__(self, path, cache_size=BLOCK_CACHE):
+        super().__init__(path, cache_size)
+        try:
+            offset, start = self.read_gzi(path + ".gzi")
+            end = os.fstat(self.fd).st_size
+            header = os.pread(self.fd, BGZF_HEADER, offset)
+            while offset < end:
+                size = bgzf_block_size(header)
+                if size is None:
+                    raise ValueError(f"{path} is not a bgzf (block gzip) file at offset {offset}, it can't be read "
+                                     "without decompressing all of it: recompress it with bgzip")
+                # one read per block: the uncompressed size at the end of this block and the header of the next one
+                following = os.pread(self.fd, 4 + BGZF_HEADER, offset + size - 4)
+                isize = struct.unpack_from('<I', following)[0]
+                if isize: #the empty block at the end only says the file is complete
+                    self.add_block(offset, start)
+                offset += size
+                start += isize
+                header = following[4:]
+        except struct.error:
+            self.close()
+            raise ValueError(f"{path}: the last bgzf block is cut")
+        except (OSError, ValueError):
+            self.close()
+            raise
+        self.offsets.append(end)
+        self.size = start
+
+    def read_gzi(self, path):
+        # the blocks listed in the index, returns where the walk goes on from (the last block of the index)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0, 0
+        count = struct.unpack_from('<Q', data)[0]
+        entries = array('Q', data[8:8 + 16*count])
+        if len(entries) != 2*count:
+            raise ValueError(f"{path} is not a bgzip index")
+        offset, start = 0, 0
+        for next_offset, next_start in zip(entries[0::2], entries[1::2]):
+            if next_start > start:
+                self.add_block(offset, start)
+            offset, start = next_offset, next_start
+        return offset, start
+
+    def decompress(self, data, n):
+        return zlib.decompressobj(-zlib.MAX_WBITS).decompress(data[12 + struct.unpack_from('<H', data, 10)[0]:])
+
+
+class ZstdImage(BlockImage):
+    # a zstd image in the seekable format (t2sz, zstd contrib/seekable_format): frames compressed on
+    # their own, listed with their sizes in a seek table at the end of the file. Needs the zstandard package
+    def __init__(self, path, cache_size=BLOCK_CACHE):
+        try:
+            import zstandard #only the zstd images need it
+        except ImportError:
+            raise ValueError(f"{path}: the zstandard package is needed to read zstd images (pip install zstandard)")
+        super().__init__(path, cache_size)
+        self.zstandard = zstandard
+        self.local = threading.local() #a decompression context is not thread safe, one per thread
+        try:
+            end = os.fstat(self.fd).st_size
+            footer = os.pread(self.fd, SEEK_TABLE_FOOTER, end - SEEK_TABLE_FOOTER) if end >= SEEK_TABLE_FOOTER else b''
+            if len(footer) < SEEK_TABLE_FOOTER or struct.unpack_from('<I', footer, 5)[0] != SEEKABLE_MAGIC:
+                raise ValueError(f"{path} has no zstd seek table, it can't be read without decompressing all of it: "
+                                 "recompress it in the zstd seekable format (t2sz for instance)")
+            frames, descriptor = struct.unpack_from('<IB', footer)
+            entry = 12 if descriptor & 0x80 else 8 #with a checksum of each frame or not
+            table = os.pread(self.fd, frames*entry, end - SEEK_TABLE_FOOTER - frames*entry)
+            offset, start = 0, 0
+            for n in range(frames):
+                compressed, decompressed = struct.unpack_from('<II', table, n*entry)
+                if decompressed:
+                    self.add_block(offset, start)
+                offset += compressed
+                start += decompressed
+        except struct.error:
+            self.close()
+            raise ValueError(f"{path}: the zstd seek table is cut")
+        except (OSError, ValueError):
+            self.close()
+            raise
+        self.offsets.append(offset)
+        self.size = start
+
+    def decompress(self, data, n):
+        context = getattr(self.local, 'context', None)
+        if context is None:
+            context = self.local.context = self.zstandard.ZstdDecompressor()
+        return context.decompressobj().decompress(data)
+
+
+def split_segments(path):
+    # every segment of the split image path is the first of (disk.001 or disk.000), [path] if it is not one
+    match = SPLIT.match(path)
+    if match is None or int(match.group(2)) > 1:
+        return [path]
+    base, number = match.group(1), int(match.group(2))
+    segments = []
+    while os.path.isfile(f"{base}.{number:03d}"):
+        segments.append(f"{base}.{number:03d}")
+        number += 1
+    return segments or [path]
+
+
+def image_kind(path):
+    # how the image at path is read: RAW, SPLIT_RAW, BGZF or ZSTD (from its name, a raw image never gets decompressed)
+    lower = path.lower()
+    if lower.endswith(BGZF_EXTENSIONS):
+        return BGZF
+    if lower.endswith(ZSTD_EXTENSIONS):
+        return ZSTD
+    if len(split_segments(path)) > 1:
+        return SPLIT_RAW
+    return RAW
+
+
+def open_image(path, cache_size=BLOCK_CACHE):
+    # the image to carve: the file (or device) itself when it is raw, an ImageReader for the containers.
+    # Raises ValueError for a container that can't be read at random offsets
+    kind = image_kind(path)
+    if kind == BGZF:
+        return BgzfImage(path, cache_size)
+    if kind == ZSTD:
+        return ZstdImage(path, cache_size)
+    if kind == SPLIT_RAW:
+        return SplitImage(split_segments(path))
+    return open(path, 'rb')
+
+
+def image_fd(f):
+    # what the writers copy from: the file descriptor of a raw image (kernel copies), the reader of a container
+    return f if isinstance(f, ImageReader) else f.fileno()
@@ -0,0 +1,151 @@
+import os
+import json
+import hashlib
+import threading
+from extract import copy_range, hash_range, hashed_copy
+from imageio import pread
+
+MANIFEST_NAME = "manifest.json" #in the output directory
+PREHASH_BYTES = 64*1024 #the pre-hash reads this much at the beginning and at the end of the file
+
+# what happens to a file whose content was already recovered
+LINK = "link" #a hard link to the first copy, every restored_i name still exists
+SKIP = "skip" #nothing, the manifest says where it was
+
+
+def prehash(src_fd, offset, length):
+    # cheap fingerprint: the size and both ends of the file, two files with different pre-hashes are different
+    quick = hashlib.blake2b(length.to_bytes(8, 'little'), digest_size=16)
+    quick.update(pread(src_fd, min(PREHASH_BYTES, length), offset))
+    if length > PREHASH_BYTES:
+        tail = min(PREHASH_BYTES, length - PREHASH_BYTES)
+        quick.update(pread(src_fd, tail, offset + length - tail))
+    return quick.hexdigest()
+
+
+def link(original, path):
+    # path becomes a hard link to original, through a temporary name so a file already there is replaced
+    if os.path.lexists(path) and os.path.samefile(original, path):
+        return #already linked by the carve a resume goes on from, a rename onto the same file would leave the temporary name
+    temporary = path + ".link"
+    if os.path.lexists(temporary):
+        os.remove(temporary)
+    os.link(original, temporary)
+    os.replace(temporary, path)
+
+
+class Deduplicator:
+    # hashes the files while the Writer extracts them and keeps one copy of each content. Files whose pre-hash was
+    # never seen are unique: they are hashed while they are written. The others are hashed first and only written
+    # if the sha-256 is new. The first file in carve order (seq) is always the one kept, whatever the thread
+    # that finishes first, so the output doesn't depend on scheduling.
+    def __init__(self, manifest_path, mode=LINK, catalog=None):
+        self.manifest_path = manifest_path
+        self.mode = mode
+        self.catalog = catalog #a Catalog (see catalog.py) of the files there, with their sha-256
+        self.lock = threading.Lock()
+        self.prehashes = set()
+        self.originals = {} #sha-256 -> (seq, path) of the copy kept
+        self.found = {} #sha-256 -> {'length', 'prehash', 'offsets': [(offset, path)]}
+        self.duplicates = 0
+        self.saved = 0 #bytes not written thanks to the deduplication
+
+    def load(self):
+        # a resumed carve keeps the hashes of the files recovered before the checkpoint
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        root = os.path.dirname(self.manifest_path)
+        for digest, entry in manifest.items():
+            self.prehashes.add(entry['prehash'])
+            self.originals[digest] = (-1, os.path.join(root, entry['file'])) #before everything of this run
+            self.found[digest] = {
+                'length': entry['length'],
+                'prehash': entry['prehash'],
+                'offsets': [(found['offset'], os.path.join(root, found['path'])) for found in entry['found']],
+            }
+
+    def copy(self, src_fd, seq, offset, length, path, fsync=False):
+        # writes (or links) the file and returns the number of bytes written
+        quick = prehash(src_fd, offset, length)
+        with self.lock:
+            seen = quick in self.prehashes
+            self.prehashes.add(quick)
+
+        written = 0
+        if seen:
+            digest = hash_range(src_fd, offset, length)
+            with self.lock:
+                original = self.originals.get(digest)
+                if original is not None and original[1] != path: #the same path is this file carved again, not a duplicate
+                    self.record(digest, quick, offset, length, path)
+                    self.duplicates += 1
+                    self.saved += length
+                    if self.mode == LINK:
+                        link(original[1], path)
+                        self.listed(path, offset, length, digest)
+                    elif original[0] > seq:
+                        os.replace(original[1], path)
+                        self.unlisted(original[1])
+                        self.listed(path, offset, length, digest)
+                    if original[0] > seq: #the copy kept comes later in the image, this one takes its place
+                        self.originals[digest] = (seq, path)
+                    return 0
+            written = copy_range(src_fd, offset, length, path, fsync=fsync) #same ends, different content
+        else:
+            written, digest = hashed_copy(src_fd, offset, length, path, fsync=fsync)
+
+        with self.lock:
+            self.record(digest, quick, offset, length, path)
+            original = self.originals.get(digest)
+            if original is None or original[1] == path:
+                self.originals[digest] = (seq, path)
+                self.listed(path, offset, length, digest)
+                return written
+            # another thread wrote the same content at the same time, the first in carve order stays
+            self.duplicates += 1
+            self.saved += length
+            mine = path
+            if original[0] > seq:
+                self.originals[digest] = (seq, path)
+                original, path = (seq, path), original[1]
+            if self.mode == LINK:
+                link(original[1], path)
+            else:
+                os.remove(path)
+                self.unlisted(path)
+            if self.mode == LINK or original[1] == mine:
+                self.listed(mine, offset, length, digest)
+        return written
+
+    def listed(self, path, offset, length, digest):
+        if self.catalog is not None:
+            self.catalog.add(path, offset, length, digest)
+
+    def unlisted(self, path):
+        if self.catalog is not None:
+            self.catalog.remove(path)
+
+    def record(self, digest, quick, offset, length, path):
+        entry = self.found.setdefault(digest, {'length': length, 'prehash': quick, 'offsets': []})
+        if (offset, path) not in entry['offsets']: #a file of the manifest loaded, carved again
+            entry['offsets'].append((offset, path))
+
+    def save(self):
+        # the evidence manifest: every content recovered, the file kept for it and every offset where it was found
+        root = os.path.dirname(self.manifest_path)
+        with self.lock:
+            manifest = {}
+            for digest, entry in self.found.items():
+                manifest[digest] = {
+                    'length': entry['length'],
+                    'prehash': entry['prehash'],
+                    'file': os.path.relpath(self.originals[digest][1], root),
+                    'found': [{'offset': offset, 'path': os.path.relpath(path, root)} for offset, path in sorted(entry['offsets'])],
+                }
+        temporary = self.manifest_path + ".tmp"
+        with open(temporary, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(temporary, self.manifest_path)
@@ -0,0 +1,102 @@
+import os
+import errno
+import hashlib
+from imageio import pread
+
+COPY_CHUNK = 1024*1024 #used only when the kernel can't copy for us
+# errors that mean "this kind of copy is not possible between these two files", not a real I/O error
+UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF, errno.ESPIPE}
+
+
+def kernel_copy(copy, src_fd, dst_fd, offset, length):
+    # returns how many bytes the kernel copied, it stops early if the call is not supported for these files
+    copied = 0
+    while copied < length:
+        try:
+            n = copy(src_fd, dst_fd, offset + copied, length - copied)
+        except OSError as e:
+            if e.errno in UNSUPPORTED and copied == 0:
+                return 0
+            raise
+        if n == 0: #end of the image
+            break
+        copied += n
+    return copied
+
+
+def copy_file_range(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset_src=offset)
+
+
+def sendfile(src_fd, dst_fd, offset, count):
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def chunked_copy(src_fd, dst_fd, offset, length):
+    copied = 0
+    while copied < length:
+        chunk = pread(src_fd, min(COPY_CHUNK, length - copied), offset + copied)
+        if not chunk:
+            break
+        os.write(dst_fd, chunk)
+        copied += len(chunk)
+    return copied
+
+
+def copy_range(src_fd, offset, length, dest, fsync=False):
+    # copies length bytes of the image starting at offset into the file dest, without going through python when possible:
+    # copy_file_range (same filesystem, even reflinks on btrfs/xfs), then sendfile (devices, other filesystems), then pread/write
+    # the file pointer of src_fd is never moved, so it is safe to share it with the scan loop
+    # src_fd can also be the ImageReader of a container (containers.py), its bytes go through python
+    # with fsync the data is on the disk when this returns, not only in the page cache
+    # returns the number of bytes written
+    dst_fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        copied = 0
+        for copy in (copy_file_range, sendfile):
+            if not isinstance(src_fd, int) or not hasattr(os, copy.__name__):
+                continue
+            copied = kernel_copy(copy, src_fd, dst_fd, offset, length)
+            if copied:
+                break
+        if copied < length:
+            copied += chunked_copy(src_fd, dst_fd, offset + copied, length - copied)
+        if fsync:
+            os.fsync(dst_fd)
+        return copied
+    finally:
+        os.close(dst_fd)
+
+
+def hash_range(src_fd, offset, length):
+    # sha-256 of length bytes of the image starting at offset, nothing is written
+    digest = hashlib.sha256()
+    done = 0
+    while done < length:
+        chunk = pread(src_fd, min(COPY_CHUNK, length - done), offset + done)
+        if not chunk:
+            break
+        digest.update(chunk)
+        done += len(chunk)
+    return digest.hexdigest()
+
+
+def hashed_copy(src_fd, offset, length, dest, fsync=False):
+    # like copy_range but the bytes go through python so they are hashed while they are written, in one pass
+    # returns (bytes written, sha-256)
+    digest = hashlib.sha256()
+    dst_fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        copied = 0
+        while copied < length:
+            chunk = pread(src_fd, min(COPY_CHUNK, length - copied), offset + copied)
+            if not chunk:
+                break
+            digest.update(chunk)
+            os.write(dst_fd, chunk)
+            copied += len(chunk)
+        if fsync:
+            os.fsync(dst_fd)
+        return copied, digest.hexdigest()
+    finally:
+        os.close(dst_fd)
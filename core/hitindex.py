@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import hashlib
+from signatures import SIGNATURES
+from containers import open_image
+
+INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "lawliet") #one index file per image
+INDEX_BATCH = 10000 #hits kept in memory before they are written
+
+# what happened to a hit
+CARVED = "carved" #a file was extracted from here
+INVALID = "invalid" #the header is there but the structure after it is not a file
+INSIDE = "inside" #the header is inside a file already extracted (or still open)
+INCOMPLETE = "incomplete" #a header whose footer never came
+SKIPPED = "skipped" #a file of a format that was not asked for, found by the header of one that was (a zip for office_new)
+
+
+def image_size(isopath):
+    with open_image(isopath) as f:
+        return f.seek(0, os.SEEK_END) #works for block devices and containers too
+
+
+def index_path(isopath, totalsize, index_dir=INDEX_DIR, unallocated=False, signatures=SIGNATURES):
+    # the index belongs to this image as it is now: a new mtime or size (or new signatures) means a new index,
+    # a carve of the unallocated space or of some formats only (signatures) has its own
+    isopath = os.path.abspath(isopath)
+    key = f"{isopath}:{totalsize}:{os.stat(isopath).st_mtime_ns}:{sorted(signatures.items())!r}"
+    if unallocated:
+        key += ":unallocated"
+    return os.path.join(index_dir, hashlib.sha256(key.encode()).hexdigest()[:32] + ".sqlite")
+
+
+class HitIndex:
+    # every signature hit of an image as (offset, format, length, status), plus the number and extension of the
+    # file extracted from it, so a later run can list or extract the files without scanning the image again
+    def __init__(self, path, progress=None):
+        self.path = path
+        self.progress = progress #a CarveProgress counting the hits by format and status
+        self.pending = []
+        self.token = None #the carve filling the index owns it, see reset
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL") #the web api can read it while a carve writes it
+        self.db.execute("""CREATE TABLE IF NOT EXISTS hits (
+            offset INTEGER, format TEXT, length INTEGER, status TEXT, number INTEGER, extension TEXT,
+            PRIMARY KEY (offset, format)) WITHOUT ROWID""")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.commit()
+
+    @classmethod
+    def for_image(cls, isopath, totalsize, index_dir=INDEX_DIR, progress=None, unallocated=False, signatures=SIGNATURES):
+        os.makedirs(index_dir, exist_ok=True)
+        return cls(index_path(isopath, totalsize, index_dir, unallocated, signatures), progress)
+
+    @property
+    def complete(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'complete'").fetchone()
+        return row is not None and row[0] == "1"
+
+    def add(self, offset, format, length, status, number=None, extension=None, counted_as=None):
+        # counted_as: the format the progress counts the hit in, a docx found by the zip header is an office_new file
+        self.pending.append((offset, format, length, status, number, extension))
+        if self.progress is not None:
+            self.progress.hit(counted_as or format, status)
+        if len(self.pending) >= INDEX_BATCH:
+            self.flush()
+
+    def flush(self):
+        # the same hit found again (after a resume) replaces the old one
+        self.db.executemany("INSERT OR REPLACE INTO hits VALUES (?, ?, ?, ?, ?, ?)", self.pending)
+        self.db.commit()
+        self.pending = []
+
+    @property
+    def owner(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'owner'").fetchone()
+        return row[0] if row is not None else None
+
+    def reset(self):
+        # a new carve of the image starts, the old hits go. The carve owns the index from now on (token): another
+        # carve of the same image, a second web job, resetting it takes it over and this one can't finish it
+        self.pending = []
+        self.token = os.urandom(16).hex()
+        self.db.execute("DELETE FROM hits")
+        self.db.execute("DELETE FROM meta")
+        self.db.execute("INSERT INTO meta VALUES ('owner', ?)", (self.token,))
+        self.db.commit()
+
+    def claim(self, token):
+        # a resumed carve goes on with the index of its checkpoint, if no other carve reset it since
+        if token is not None and self.owner == token:
+            self.token = token
+        return self.token is not None
+
+    def finish(self):
+        # marks the index complete, returns False if the carve doesn't own it anymore: its hits may have been wiped
+        self.flush()
+        if self.token is None:
+            return False
+        cursor = self.db.execute("INSERT OR REPLACE INTO meta SELECT 'complete', '1' WHERE EXISTS (SELECT 1 FROM meta WHERE key = 'owner' AND value = ?)", (self.token,))
+        self.db.commit()
+        return cursor.rowcount == 1
+
+    def hits(self, formats=None, status=None, start=None, end=None, limit=None, skip=0, recovered_as=None):
+        # returns the hits as dicts in offset order, filtered by format (a list), status and offset range [start, end)
+        # recovered_as(format, extension): the format a hit is recovered as (strategies.output_format), the formats
+        # are matched against it instead of the format of the header: a docx found by the zip header is office_new
+        query = "SELECT offset, format, length, status, number, extension FROM hits WHERE 1"
+        args = []
+        if formats:
+            column = "format"
+            if recovered_as is not None:
+                self.db.create_function("recovered_as", 2, recovered_as, deterministic=True)
+                column = "recovered_as(format, extension)"
+            query += f" AND {column} IN ({', '.join('?' * len(formats))})"
+            args += formats
+        if status:
+            query += " AND status = ?"
+            args.append(status)
+        if start is not None:
+            query += " AND offset >= ?"
+            args.append(start)
+        if end is not None:
+            query += " AND offset < ?"
+            args.append(end)
+        query += " ORDER BY offset, format LIMIT ? OFFSET ?"
+        args += [-1 if limit is None else limit, skip]
+        columns = ("offset", "format", "length", "status", "number", "extension")
+        return [dict(zip(columns, row)) for row in self.db.execute(query, args)]
+
+    def close(self):
+        self.db.close()
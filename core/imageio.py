@@ -0,0 +1,62 @@
+import os
+import mmap
+
+SEARCH_CHUNK = 1024*1024 #searching files (not mappings) 1MB at a time
+WINDOW_SIZE = 64*1024
+
+
+def pread(g, size, offset):
+    # os.pread for a file descriptor, a file or an ImageReader (a split or compressed image, see containers.py)
+    if isinstance(g, int):
+        return os.pread(g, size, offset)
+    if hasattr(g, 'pread'):
+        return g.pread(size, offset)
+    return os.pread(g.fileno(), size, offset)
+
+
+def read_at(g, offset, size):
+    # small random reads from the image, g can be the file or the mmap of it
+    # pread doesn't move the file pointer, so the carving strategies never mess with the position of the caller
+    if isinstance(g, mmap.mmap):
+        return g[offset:offset + size]
+    return pread(g, size, offset)
+
+
+def find_at(g, sub, start, end):
+    # same as bytes.find but on the image, returns the absolute offset or -1
+    if isinstance(g, mmap.mmap):
+        return g.find(sub, start, end)
+    position = start
+    while position < end:
+        chunk = read_at(g, position, min(SEARCH_CHUNK, end - position))
+        if len(chunk) < len(sub):
+            return -1
+        found = chunk.find(sub)
+        if found != -1:
+            return position + found
+        position += len(chunk) - len(sub) + 1 #the signature can be cut between two chunks
+    return -1
+
+
+class MappedImage(mmap.mmap): #the read-only mapping of the image, that still knows its file descriptor for the kernel copies
+    def __new__(cls, f, size):
+        image = super().__new__(cls, f.fileno(), size, access=mmap.ACCESS_READ)
+        image.fd = f.fileno()
+        return image
+
+    def fileno(self):
+        return self.fd
+
+
+class Window: #keeps the last WINDOW_SIZE bytes read, so structures walked forward cost one read per window and not one per field
+    def __init__(self, g, size=WINDOW_SIZE):
+        self.g = g
+        self.size = size
+        self.start = 0
+        self.data = b''
+
+    def read(self, offset, size):
+        if offset < self.start or offset + size > self.start + len(self.data):
+            self.start = offset
+            self.data = read_at(self.g, offset, max(size, self.size))
+        return self.data[offset - self.start : offset - self.start + size]
@@ -1,16 +1,25 @@
 import os
 import sys
-import tqdm
+import mmap
+import argparse
 from signatures import SIGNATURES
-from rich.console import Console
-from rich.panel import Panel
-from rich.live import Live
-from rich.table import Table
-from rich.progress import Progress
+from scanner import Scanner
+from parallel import scan_parallel, HEADER
+from imageio import MappedImage
+from writer import Writer, WRITER_THREADS
+from reader import ReadAhead, READ_AHEAD
+from strategies import Carver, select, strategy_of, restored_path, output_format, LIMIT_SECURITY
+from checkpoint import Checkpoint
+from hitindex import HitIndex, index_path, INDEX_DIR, CARVED, INVALID, INSIDE, INCOMPLETE
+from dedup import Deduplicator, MANIFEST_NAME, LINK, SKIP
+from catalog import Catalog
+from progress import CarveProgress
+from sparse import find_holes, EmptySpace
+from unallocated import unallocated as find_unallocated
+from containers import open_image, image_fd, ImageReader
+from log import Log, LEVELS, SUMMARY, VERBOSE
 
 OVERLAP = 1024 #this is necessary because we need to search for the signature in the previous 1024 bytes
-LIMIT_SECURITY = 400*1024*1024 #limiting the search to 400MB because i don't wanna to have a disaster
-console = Console()
 
 
 ASCII_ART = """
@@ -28,185 +37,452 @@ ASCII_ART = """
 """
 
 def print_welcome():
-    console.print(Panel(ASCII_ART, subtitle="Version - 1.0", border_style="blue"))
-
-def carve_zip(i, outpath, header_pos, g): #this was the hardest function to write, so everything is commented
-    original_pos = g.tell() #just saving the position that we had initially
-    g.seek(header_pos) #move to the header position we have saved to header_pos variable
-    max_search = 100 * 1024 * 1024 #limiting the search to 100MB because i don't wanna to have a disaster
-    data_to_search = g.read(max_search)
-    
-    eocd_pos = data_to_search.rfind(b'\x50\x4b\x05\x06') # Finding the End Of central directory (it is some ZIP shit)
-    
-    if eocd_pos != -1:
-        comment_len_offset = eocd_pos + 20 #the comment length is stored in the 20th byte of the End Of central directory
-        if comment_len_offset + 2 <= len(data_to_search): #Checking if the comment is valid
-            comment_len = int.from_bytes(data_to_search[comment_len_offset:comment_len_offset+2], 'little')
-            total_zip_size = eocd_pos + 22 + comment_len
-            g.seek(header_pos) #if all this shit is valid we move the pointer to header_pos and read the file
-            zip_data = g.read(total_zip_size) #reading the file
-            name = f"restored_{i}.zip" #the name of the file
-            with open(os.path.join(outpath, "zip", name), 'wb') as rf: #opening the file in write binary mode
-                rf.write(zip_data)  #writing the file
-            g.seek(original_pos) #return the pointer to the original position for not fucking up the program
-            return True #return true if the file was restored successfully
-
-    g.seek(original_pos) #return to the original position even if everything's gone wrong
-    return False #return false if the file was not restored successfully
-
-def carve_mp4(i, outpath, header, g):
-    g.seek(header) #go to the header position
-    size_mp4 = 0 #initialize some variables
-    found_moov = False
-    found_ftyp = False
-    
+    from rich.console import Console #rich takes a while to import, only the interactive CLI needs it
+    from rich.panel import Panel
+    Console().print(Panel(ASCII_ART, subtitle="Version - 1.0", border_style="blue"))
+
+def carve_header(carver, i, format, header, skip_until):
+    # the strategy of the format (see strategies.py) carves the file of the header found at header,
+    # returns the file counter after it
+    strategy = strategy_of(format)
+    start = header + strategy.offset
+    carver.skipped = False
+    end = strategy.carve(carver, i, format, start) if start >= 0 else 0
+    if not end:
+        carver.index.add(start if start >= 0 else header, format, 0, INVALID)
+        skip_until[format] = header + len(SIGNATURES[format]['header'])
+        return i
+    for other in skip_until if strategy.family else [format]:
+        if strategy_of(other) is strategy:
+            skip_until[other] = end #the headers inside the file are not new files
+    return i if carver.skipped else i + 1
+
+
+class OpenCarve: #a header_footer file whose footer was not found yet, it stays open while the buffers go by
+    def __init__(self, format, start):
+        self.format = format
+        self.start = start
+        self.footer = SIGNATURES[format]['footer']
+        self.search_from = start + len(SIGNATURES[format]['header']) #absolute offset where the footer search continues
+
+    def advance(self, window, base, window_end, limit=None):
+        # returns the end of the file if the footer is in this window and starts before limit (absolute, the whole window if None)
+        end = window_end if limit is None else min(window_end, limit + len(self.footer) - 1)
+        position_footer = window.find(self.footer, self.search_from - base, end - base)
+        if position_footer == -1:
+            self.search_from = max(self.search_from, end - len(self.footer) + 1) #the footer can begin here and end in the next read
+            return None
+        return base + position_footer + len(self.footer)
+
+    def finish(self, carver, i, end):
+        # only the offsets were kept, the bytes go from the image to the output file in one kernel copy
+        carver.extract(i, self.format, self.start, end)
+
+
+def restore(state, signatures):
+    # returns (position, i, skip_until, open carves as format -> (start, search_from)) saved in a checkpoint,
+    # or the beginning of the image when there is nothing to resume
+    skip_until = {format: 0 for format in signatures}
+    if state is None:
+        return 0, 0, skip_until, {}
+    skip_until.update(state['skip_until'])
+    return state['position'], state['i'], skip_until, {format: tuple(carving) for format, carving in state['open_carves'].items()}
+
+
+def carve_parallel(isopath, carver, signatures, totalsize, buffer_size, workers, progress, checkpoint, holes, ranges, empty, state=None):
+    # the workers only scan, the files are extracted here in offset order so the numbering never depends on who finished first
+    # open_carves: format -> (start, search_from), same rules as OpenCarve
+    position, i, skip_until, open_carves = restore(state, signatures)
+    index = carver.index
+    progress.skip(ranges.before(position) if ranges is not None else position)
+    for segment_start, length, events, extents in scan_parallel(isopath, totalsize, buffer_size, workers, signatures, start=position, holes=holes, ranges=ranges):
+        for extent in extents:
+            empty.add(*extent)
+        for offset, kind, format in events:
+            if kind != HEADER:
+                if format in open_carves and offset >= open_carves[format][1]:
+                    start = open_carves.pop(format)[0]
+                    end = offset + len(SIGNATURES[format]['footer'])
+                    if end - start > LIMIT_SECURITY:
+                        index.add(start, format, 0, INCOMPLETE) #no footer in 400MB, that's not a real file
+                        continue
+                    carver.extract(i, format, start, end)
+                    i = i+1
+                    skip_until[format] = end
+                continue
+
+            if format in open_carves: #a stray header, no footer before this one (see carve_sequential)
+                index.add(open_carves.pop(format)[0], format, 0, INCOMPLETE)
+            elif offset < skip_until[format]:
+                index.add(offset, format, 0, INSIDE)
+                continue #this header is inside a file we already extracted
+
+            if strategy_of(format).carve is None: #header_footer
+                open_carves[format] = (offset, offset + len(SIGNATURES[format]['header']))
+            else:
+                i = carve_header(carver, i, format, offset, skip_until)
+
+        segment_end = segment_start + length
+        for format in list(open_carves):
+            if segment_end - open_carves[format][0] > LIMIT_SECURITY:
+                index.add(open_carves.pop(format)[0], format, 0, INCOMPLETE) #no footer in 400MB, that's not a real file
+        progress.update(length)
+
+        if checkpoint.due():
+            carver.writer.flush() #every file counted in i must be on the disk before the checkpoint says so
+            index.flush()
+            checkpoint.save(segment_end, i, skip_until, open_carves)
+
+    for format, (start, search_from) in open_carves.items():
+        index.add(start, format, 0, INCOMPLETE)
+
+
+def carve_sequential(f, carver, signatures, totalsize, buffer_size, read_ahead, progress, checkpoint, holes, ranges, empty, state=None):
+    # ranges: the Extents to scan (--unallocated), None for the whole image
+    scanner = Scanner(signatures) #the automaton is built once for the whole carve, with the headers of the formats carved only
+    scanned, i, skip_until, carvings = restore(state, signatures) #scanned: headers that end before it were already handled
+    source, index = carver.source, carver.index
+    open_carves = {} #format -> OpenCarve, at most one per format like the old search_pointer
+    for format, (start, search_from) in carvings.items():
+        open_carves[format] = OpenCarve(format, start)
+        open_carves[format].search_from = search_from
+    # when resuming, the OVERLAP before the checkpoint is read again so the headers straddling it are found
+    actual_position = max(0, scanned - OVERLAP)
+    progress.skip(ranges.before(actual_position) if ranges is not None else actual_position)
+    reader = None
+    if isinstance(source, MappedImage):
+        window = source #the mapping is the window, nothing is copied
+    else:
+        # the buffers are allocated once and reused: the last OVERLAP bytes of the previous read are copied in front
+        # of the new one, so headers and footers that straddle two reads are still found
+        f.seek(actual_position)
+        reader = ReadAhead(f, buffer_size, front=OVERLAP, depth=read_ahead, holes=holes, ranges=ranges)
+        progress.reader = reader
+        window = None
+    tail = 0 #how many bytes of the previous read are searched again with this one
+    # skip_until: absolute offsets, headers before that are inside a file already handled
+    flag = 0
+
+    def close(format, end):
+        nonlocal i
+        carving = open_carves.pop(format)
+        if end - carving.start > LIMIT_SECURITY:
+            index.add(carving.start, format, 0, INCOMPLETE) #no footer in 400MB, that's not a real file
+            return
+        carving.finish(carver, i, end)
+        i = i+1 #counting the number of extracted files
+        skip_until[format] = end #skipping the headers inside the file we just extracted
+
+    def close_before(limit=None):
+        # closes the open files whose footer starts before limit, in image order: the files are numbered in the
+        # order their header (or footer) comes in the image, whatever the size of the reads (and like carve_parallel)
+        ended = []
+        for format, carving in open_carves.items():
+            end = carving.advance(window, base, window_end, limit)
+            if end is not None:
+                ended.append((end - len(carving.footer), scanner.order[format], format, end))
+        for _, _, format, end in sorted(ended):
+            close(format, end)
+
     try:
-        while size_mp4 < LIMIT_SECURITY: #limiting the size for security reasons (my pc not crashing pls)
-            current_box_pos = header + size_mp4
-            g.seek(current_box_pos)
-            
-            headers = g.read(8) #read the first 8 bytes of the file
-            if len(headers) < 8: #if this headers length is less than 8 , is broken
-                break
-            
-            box_size = int.from_bytes(headers[:4], byteorder='big') #the box size is stored in the first 4 bytes
-            box_name = headers[4:] #the box name is stored in the next 4 bytes
-
-            if box_size < 8: 
-                break #if the box size is less than 8, is broken
-            
-            if box_name == b"ftyp": 
-                found_ftyp = True #this thing is important for the majority of mp4 files
-            if box_name == b"moov": 
-                found_moov = True #this also
-            
-            if box_size == 1: 
-                box_size = int.from_bytes(g.read(8), byteorder='big') # some mp4 files do this shit and store the size in the next 8 bytes
-            
-            if size_mp4 + box_size > LIMIT_SECURITY: # again, security reasons...
-                break
-                
-            size_mp4 = size_mp4 + box_size #incrementing size_mp4 file size
-            
-            if found_ftyp and found_moov:
-                g.seek(header + size_mp4)
-                check = g.read(4)
-                if not check or int.from_bytes(check, 'big') == 0: #checking if there something to read or just zeros, in any case, the file has ended so we break the loop
-                    break
-
-        if size_mp4 > 8 and found_ftyp: #if the file is valid...
-            g.seek(header) #move the pointer to the initial position of the file
-            name = f"restored_{i}.mp4" #name of the file
-            target_path = os.path.join(outpath, "mp4", name) #patjh of the file
-            
-            with open(target_path, 'wb') as restored_file: #opening the file in write binary mode
-                remaining = size_mp4 #remaining size of the file (we are writing in chunks this time for not crashing the application)
-                while remaining > 0:
-                    chunk_to_read = min(1024 * 1024, remaining) #reading the file in chunks of 1MB or less if the file is smaller
-                    chunk = g.read(chunk_to_read) #reading the file
-                    if not chunk: break
-                    restored_file.write(chunk) #writing the file
-                    remaining -= len(chunk)
-            
-            
-            return True
-            
-        return False
-    except Exception as e:
-        print(f"Error carving the mp4 file: {e}") #printing the error
-        return False
+        while flag==0: #yeah this is different but it works and i was used to C , not python :D
+            if reader is not None:
+                position, buffer, read = reader.next() #already read by the ReadAhead thread most of the time
+            elif ranges is not None:
+                position, read = ranges.next(actual_position, buffer_size)
+            else:
+                position, read = actual_position, min(buffer_size, totalsize - actual_position)
+            if position != actual_position:
+                # the reads jumped over allocated space, nothing found before it goes on after it
+                if window is not None:
+                    close_before() #the footers left for this read, at the end of the previous one
+                tail = 0
+                for carving in open_carves.values():
+                    carving.search_from = max(carving.search_from, position)
+                actual_position = position
+            if reader is not None:
+                if window is not None:
+                    buffer[OVERLAP - tail : OVERLAP] = window[window_end - base - tail : window_end - base]
+                    reader.release(window)
+                window = buffer
+                base = actual_position - OVERLAP #absolute offset of window[0]
+            else:
+                base = 0 #the mapping starts at the beginning of the image
+            if not read:
+                flag=1 #nothing more to read
+            window_end = actual_position + read
+            scan_from = max(actual_position - tail, actual_position - scanner.max_header + 1)
+
+            for position_header, format in scanner.scan(window, scan_from - base, window_end - base, base, empty): #wiped space is not searched
+                target_signature = SIGNATURES[format]['header']
+                if position_header + len(target_signature) <= scanned:
+                    continue #this header was complete in the previous read, so it was already handled
+
+                if open_carves:
+                    close_before(position_header + 1) #the files whose footer comes first get the lower numbers
+                if format in open_carves:
+                    # no footer between the two headers: the first one was a stray header, not a file that would
+                    # hide every header of its format up to LIMIT_SECURITY
+                    index.add(open_carves.pop(format).start, format, 0, INCOMPLETE)
+                elif position_header < skip_until[format]:
+                    index.add(position_header, format, 0, INSIDE)
+                    continue #this header is inside a file we already extracted
 
+                #Here we will begin the extraction process for files
+                if strategy_of(format).carve is None: #header_footer
+                    open_carves[format] = OpenCarve(format, position_header)
+                else:
+                    i = carve_header(carver, i, format, position_header, skip_until)
 
-def carve(isopath, outpath, buffer_size):
-    for format in SIGNATURES:
+            # the footers of the open files can be anywhere after the last header, but not the ones a header cut by the
+            # end of this read comes before: they wait for the next read
+            close_before(window_end - scanner.max_header + 1 if read else None)
+            for format in list(open_carves):
+                if window_end - open_carves[format].start > LIMIT_SECURITY:
+                    index.add(open_carves.pop(format).start, format, 0, INCOMPLETE) #no footer in 400MB, that's not a real file
+
+            progress.update(read)
+            tail = min(OVERLAP, tail + read) #the end of this read is searched again with the next one
+            actual_position = window_end
+            scanned = max(scanned, window_end)
+
+            if read and checkpoint.due():
+                carver.writer.flush() #every file counted in i must be on the disk before the checkpoint says so
+                index.flush()
+                checkpoint.save(window_end, i, skip_until, {format: (carving.start, carving.search_from) for format, carving in open_carves.items()})
+    finally:
+        if reader is not None:
+            reader.close() #also when the carve is cancelled or a strategy fails, the buffers go with it
+
+    # the files still open when the image ends have no footer, they are incomplete and nothing was written for them
+    for format, carving in open_carves.items():
+        index.add(carving.start, format, 0, INCOMPLETE)
+
+
+def report_duplicates(dedup, log):
+    if dedup is not None:
+        log.info(f"{dedup.duplicates} duplicate files ({dedup.saved} bytes not written), manifest in {dedup.manifest_path}")
+
+def report_empty(empty, log):
+    if empty.count:
+        listed = f", the first {len(empty.extents)} listed" if len(empty.extents) < empty.count else ""
+        log.info(f"{empty.bytes} bytes of empty space skipped in {empty.count} extents (zero or constant filled{listed})")
+        log.empty(empty.extents)
+
+
+def extract_hits(isopath, outpath, hits, writers=WRITER_THREADS, fsync=False, dedup=None, catalog=None, progress=None, log=None):
+    # writes the carved files listed in a hit index, with the same names as the carve that found them, without scanning
+    # dedup: None, LINK or SKIP, what to do with the files whose content was already recovered
+    log = log or Log()
+    own_catalog = catalog is None
+    if own_catalog:
+        os.makedirs(outpath, exist_ok=True)
+        catalog = Catalog(outpath, isopath)
+    if dedup is not None:
+        dedup = Deduplicator(os.path.join(outpath, MANIFEST_NAME), dedup, catalog)
+    with open_image(isopath) as f:
+        writer = Writer(image_fd(f), threads=writers, fsync=fsync, dedup=dedup, catalog=catalog, log=log)
+        if progress is not None:
+            progress.writer = writer
+        try:
+            for hit in hits:
+                if hit['status'] != CARVED:
+                    continue
+                path = restored_path(outpath, hit['format'], hit['number'], hit['extension'])
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                writer.write(hit['offset'], hit['length'], path)
+                if progress is not None:
+                    progress.hit(output_format(hit['format'], hit['extension']), CARVED) #the totals count the files like a carve does
+                    progress.update(hit['length'])
+        finally:
+            writer.close()
+            if own_catalog:
+                catalog.close()
+    report_duplicates(dedup, log)
+
+
+def carve(isopath, outpath, buffer_size, use_mmap=False, workers=1, writers=WRITER_THREADS, fsync=False, read_ahead=READ_AHEAD, resume=False, index_dir=INDEX_DIR, rescan=False, dedup=None, unallocated=False, formats=None, progress=None, log=None):
+    # progress: a CarveProgress shared with the caller (the web api), log: where the messages and stats go (see log.py)
+    # unallocated: only the clusters the filesystems of the image have free are scanned (see unallocated.py)
+    # formats: the names of the formats to carve (see signatures.py), None for all of them
+    # returns False when the carve stopped on an error (logged), True when it went to the end of the image
+    log = log or Log()
+    if progress is None:
+        progress = CarveProgress()
+    progress.log = log
+    try:
+        signatures = select(formats)
+    except ValueError as e:
+        log.error(str(e))
+        return False
+    # the formats asked for, in the order of SIGNATURES: the family of one is scanned (signatures) but not written
+    formats = None if signatures is SIGNATURES else [format for format in signatures if format in formats]
+    for format in formats or signatures:
         os.makedirs(os.path.join(outpath, format), exist_ok=True)
 
-    with open(isopath, 'rb') as f:
+    try:
+        # split (.001, .002...) and compressed (bgzf, seekable zstd) images are read as one image, see containers.py
+        f = open_image(isopath)
+    except PermissionError:
+        log.error("You need to run as sudo to access the pendrive directly.")
+        return False
+    except (OSError, ValueError) as e:
+        log.error(f"opening the image: {e}")
+        return False
+    with f:
         try:
-            totalsize = os.path.getsize(isopath)
+            totalsize = f.seek(0, os.SEEK_END) #getsize says 0 for block devices, seeking to the end works for both
+            f.seek(0)
         except PermissionError:
-            print("Error: You need to run as sudo to access the pendrive directly.")
-            return
+            log.error("You need to run as sudo to access the pendrive directly.")
+            return False
         except OSError as e:
-            print(f"Error reading the device: {e}")
-            return
-        progress = tqdm.tqdm(total=totalsize, unit='B', unit_scale=True)
-        flag = 0
-        i = 0
-        while flag==0: #yeah this is different but it works and i was used to C , not python :D
-            actual_position = f.tell()
-            data = f.read(buffer_size)
-            if not data:
-                print("Nothing more to read")
-                flag=1
-            for format in SIGNATURES: 
-                # here i am just initializing some useful variables
-                position_header = -1
-                search_pointer = 0
-                while True:
-                    if format == "mp4":
-                        target_signature = b'ftyp' #why does mp4 have a so fucking different signature?
-                    else:
-                        target_signature = SIGNATURES[format]['header']
-                    
-                    position_header = data.find(target_signature, search_pointer) #finding the signature of the formats
-                    
-                    if position_header == -1:
-                        print(f"No more {format} in buffer") #if no more headers are found, break and go to next format
-                        break
-
-
-                    if format == "mp4":
-                        abs_start = actual_position + position_header - 4 #the headers of mp4 files are 4 bytes before ftyp
-                    else:
-                        abs_start = actual_position + position_header
-
-                    #Here we will begin the extraction process for files
-                    if format == "mp4":
-                        if carve_mp4(i, outpath, abs_start, f):
-                            i = i+1
-                        search_pointer = position_header + 4
-                        
-                    elif format == "zip":
-                        if carve_zip(i, outpath, abs_start, f):
-                            i = i+1
-                        search_pointer = position_header + 4
-
-                    else:
-                        position_footer = data.find(SIGNATURES[format]['footer'], position_header + len(target_signature))
-                        
-                        if position_footer != -1: #if footer is found
-                            footer_len = len(SIGNATURES[format]['footer'])
-                            restored_raw_file = data[position_header : position_footer + footer_len]
-                            
-                            name = f"restored_{i}.{SIGNATURES[format]['extension']}"
-                            with open(os.path.join(outpath, format, name), 'wb') as rf:
-                                rf.write(restored_raw_file)
-                            print(f"Success: {format}_{i} extracted with success!")
-                            
-                            i = i+1 #counting the number of extracted files
-                            search_pointer = position_footer + footer_len #updating the search pointer for the next file
-                        else:
-                            #if footer is not found, fuck off and go to the next header
-                            search_pointer = position_header + len(target_signature)
-
-            progress.update(len(data))
+            log.error(f"reading the device: {e}")
+            return False
+        # a checkpoint is saved every CHECKPOINT_INTERVAL seconds, with resume the carve goes on from the last one
+        checkpoint = Checkpoint(outpath, isopath, totalsize, {'buffer_size': buffer_size, 'use_mmap': use_mmap, 'workers': workers, 'fsync': fsync, 'dedup': dedup, 'unallocated': unallocated, 'formats': formats})
+        state = checkpoint.resume_state() if resume else None
+        if state is not None and state['options'].get('unallocated', False) != unallocated:
+            log.info("The checkpoint is from a carve of the " + ("whole image" if unallocated else "unallocated space") + ", starting from the beginning")
+            state = None
+        elif state is not None and state['options'].get('formats') != formats:
+            log.info("The checkpoint is from a carve of other formats, starting from the beginning")
+            state = None
+        elif resume and state is None:
+            log.info("No checkpoint for this image, starting from the beginning")
+        elif state is not None:
+            log.info(f"Resuming from offset {state['position']} ({state['i']} files already recovered)")
+
+        # every file written goes in the catalog of the output directory, the web api lists the files from it
+        catalog = Catalog(outpath, isopath)
+        # every hit goes in the index of the image, a later carve of the same image extracts from it without scanning
+        asked = signatures if formats is None else {format: SIGNATURES[format] for format in formats}
+        index = HitIndex.for_image(isopath, totalsize, index_dir, progress, unallocated=unallocated, signatures=asked)
+        indexed = index
+        if formats is not None and not index.complete:
+            # the files of some formats are also in the index of a carve of all of them
+            path = index_path(isopath, totalsize, index_dir, unallocated)
+            if os.path.exists(path):
+                indexed = HitIndex(path)
+        if state is None and indexed.complete and not rescan:
+            hits = indexed.hits(formats=formats, status=CARVED, recovered_as=output_format)
+            indexed.close()
+            index.close()
+            log.info(f"Extracting {len(hits)} files from the hit index of this image, use --rescan to scan it again")
+            progress.start(sum(hit['length'] for hit in hits), phase="extracting")
+            try:
+                extract_hits(isopath, outpath, hits, writers=writers, fsync=fsync, dedup=dedup, catalog=catalog, progress=progress, log=log)
+            finally:
+                catalog.close()
+            progress.finish()
+            return True
+        if indexed is not index:
+            indexed.close()
+        if state is None:
+            index.reset()
+        else:
+            index.claim(state.get('index')) #a resume whose index was reset since (the image changed, another carve) leaves it partial
+        checkpoint.index = index.token
+
+        ranges = None #what is scanned, None for everything
+        if unallocated:
+            ranges, volumes = find_unallocated(f, totalsize)
+            for volume in volumes:
+                free = sum(end - start for start, end in volume['free'])
+                log.info(f"{volume['filesystem']} at offset {volume['offset']}: {free} of {volume['size']} bytes unallocated ({volume['cluster_size']} bytes clusters)")
+            if ranges is None:
+                log.info("No known filesystem in this image, carving all of it")
+            else:
+                log.info(f"Scanning {ranges.total()} bytes in {len(ranges)} extents (unallocated clusters and space outside the filesystems)")
+        progress.start(ranges.total() if ranges is not None else totalsize)
+        container = isinstance(f, ImageReader)
+        holes = f.holes() if container else find_holes(f.fileno(), totalsize) #sparse images: the holes are never read
+        if holes:
+            log.info(f"Sparse image: {len(holes)} holes, {holes.total()} bytes that are not read")
+        empty = EmptySpace()
+        progress.empty = empty
+        source = f #what the strategies read from
+        if use_mmap and container:
+            log.info("Split and compressed images can't be mapped, reading it in buffers")
+        elif use_mmap and totalsize > 0:
+            # the whole image (or device) is mapped read-only and used as the scan window: nothing is copied,
+            # the kernel pages the image in as we go
+            source = MappedImage(f, totalsize)
+            if hasattr(source, 'madvise'):
+                source.madvise(mmap.MADV_SEQUENTIAL)
+        deduplicator = None
+        if dedup is not None:
+            deduplicator = Deduplicator(os.path.join(outpath, MANIFEST_NAME), dedup, catalog)
+            if state is not None:
+                deduplicator.load() #the files recovered before the checkpoint are still there
+        writer = Writer(image_fd(f), threads=writers, fsync=fsync, dedup=deduplicator, catalog=catalog, log=log) #the files are written in the background while we scan
+        progress.writer = writer
+        carver = Carver(outpath, source, writer, index, formats)
+        finished = False
+        try:
+            if workers > 1:
+                carve_parallel(isopath, carver, signatures, totalsize, buffer_size, workers, progress, checkpoint, holes, ranges, empty, state)
+            else:
+                carve_sequential(f, carver, signatures, totalsize, buffer_size, read_ahead, progress, checkpoint, holes, ranges, empty, state)
+            finished = True
+        finally:
+            writer.close(finished) #waiting for the last files to be written
+            catalog.close()
+            index.flush()
+            if source is not f:
+                source.close()
+        complete = progress.done >= progress.total
+        if not complete: #the reads stopped before the end (a device shorter than it says, no buffer)
+            log.error(f"The scan stopped at {progress.done} of {progress.total} bytes, the hit index stays incomplete")
+        else:
+            if index.token is not None and not index.finish():
+                log.info("Another carve of this image started its hit index again, it is left to that one")
+            checkpoint.clear() #the whole image was carved, nothing to resume
+        index.close()
+    progress.finish()
+    report_empty(empty, log)
+    report_duplicates(deduplicator, log)
+    return complete
+
+def positive(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not 1 or more")
+    return number
 
 def main():
-    print_welcome()
-    if len(sys.argv) < 3:
-        console.print("Usage: python3 lawliet.py \"isopath\" \"outpath\" -b \"buffer_size (in MB)\"")
-        console.print("Buffer size parameter is optional")
-        console.print("Default buffer size is 8MB")
-        sys.exit()
-    
-    if len(sys.argv) == 5 and sys.argv[3] == "-b": #Yeah i know it's not the best way but it works
-        buffer_size = int(sys.argv[4])*1024*1024
-    else:
-        buffer_size = 8*1024*1024
-    carve(sys.argv[1], sys.argv[2], buffer_size)
-    console.print("Carving process finished")
-    sys.exit()
+    parser = argparse.ArgumentParser(prog="lawliet.py", description="Digital Forensics File Carver")
+    parser.add_argument("isopath", help="disk image (raw, split .001, bgzip .gz, seekable .zst) or device (/dev/sdX) to carve")
+    parser.add_argument("outpath", help="directory where the recovered files are written")
+    parser.add_argument("-b", dest="buffer_size", type=positive, default=8, help="buffer size in MB (default: 8)")
+    parser.add_argument("--mmap", action="store_true", help="map the image read-only instead of reading it into buffers")
+    parser.add_argument("--workers", type=positive, default=1, help="number of processes scanning the image (default: 1)")
+    parser.add_argument("--writers", type=int, default=WRITER_THREADS, help=f"threads writing the recovered files, 0 writes them inline (default: {WRITER_THREADS})")
+    parser.add_argument("--fsync", action="store_true", help="fsync every recovered file before counting it as written")
+    parser.add_argument("--readahead", type=int, default=READ_AHEAD, help=f"buffers read in advance by a background thread, 0 disables it (default: {READ_AHEAD})")
+    parser.add_argument("--resume", action="store_true", help="go on from the last checkpoint in outpath instead of starting from the beginning")
+    parser.add_argument("--dedup", choices=[LINK, SKIP], help="hash the recovered files (see manifest.json) and hard link or skip the duplicates")
+    parser.add_argument("--rescan", action="store_true", help="scan the image again even if its hit index is complete")
+    parser.add_argument("--unallocated", action="store_true", help="only carve the clusters the filesystems of the image (FAT, exFAT, ext2/3/4, NTFS) have free")
+    parser.add_argument("--formats", type=lambda value: [format.strip() for format in value.split(",") if format.strip()], help=f"only carve these formats, comma separated: {','.join(SIGNATURES)} (default: all)")
+    parser.add_argument("--index-dir", default=INDEX_DIR, help=f"directory of the hit indexes (default: {INDEX_DIR})")
+    parser.add_argument("--log", choices=LEVELS, default=SUMMARY, help=f"what is written on stdout: {', '.join(LEVELS)} (default: {SUMMARY})")
+    args = parser.parse_args()
+    if args.formats is not None:
+        try:
+            select(args.formats)
+        except ValueError as e:
+            parser.error(str(e))
+
+    # the banner and the progress bar (rich and tqdm) only when a person is watching, not in scripts and pipes
+    interactive = args.log in (SUMMARY, VERBOSE) and sys.stdout.isatty()
+    if interactive:
+        print_welcome()
+    log = Log(args.log, periodic=not interactive) #the bar already shows the progress
+    progress = CarveProgress(bar=interactive)
+    finished = carve(args.isopath, args.outpath, args.buffer_size*1024*1024, use_mmap=args.mmap, workers=args.workers, writers=args.writers, fsync=args.fsync, read_ahead=args.readahead, resume=args.resume, index_dir=args.index_dir, rescan=args.rescan, dedup=args.dedup, unallocated=args.unallocated, formats=args.formats, progress=progress, log=log)
+    log.info("Carving process finished")
+    sys.exit(0 if finished else 1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,88 @@
+import sys
+import json
+import time
+import threading
+
+LOG_INTERVAL = 2.0 #seconds between two stats lines, whatever the number of hits
+EMPTY_BATCH = 1000 #empty extents per json event
+
+# levels
+QUIET = "quiet" #errors only
+SUMMARY = "summary" #messages, a stats line every LOG_INTERVAL and the totals at the end
+VERBOSE = "verbose" #the same plus one line per recovered file
+JSON = "json" #one json object per line, the same events as summary
+LEVELS = (QUIET, SUMMARY, VERBOSE, JSON)
+
+
+def recovered(hits):
+    # carved files per format out of the hit counts of a CarveProgress snapshot
+    return {format: counts['carved'] for format, counts in hits.items() if counts.get('carved')}
+
+
+class Log:
+    # where carve() reports what happens. The per-file events are counted by the CarveProgress and written here
+    # at most every `interval` seconds (stats()), so the output costs the same with 10 or 10 million hits.
+    # With periodic=False the stats lines are left to a progress bar and only the totals are written.
+    def __init__(self, level=SUMMARY, stream=None, interval=LOG_INTERVAL, periodic=True):
+        self.level = level
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.periodic = periodic
+        self.last = time.monotonic()
+        self.last_error = None #the web jobs show it when the carve fails
+        self.lock = threading.Lock()
+
+    def write(self, line):
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def event(self, event, **fields):
+        self.write(json.dumps({'event': event, 'time': round(time.time(), 3), **fields}))
+
+    def info(self, message):
+        if self.level == JSON:
+            self.event('info', message=message)
+        elif self.level != QUIET:
+            self.write(message)
+
+    def error(self, message):
+        self.last_error = message
+        if self.level == JSON:
+            self.event('error', message=message)
+        else:
+            self.write(f"Error: {message}")
+
+    def extracted(self, name, length):
+        # only verbose pays for one line per file
+        if self.level == VERBOSE:
+            self.write(f"Success: {name} extracted with success! ({length} bytes)")
+
+    def empty(self, extents):
+        # the [start, end, fill] extents skipped by the scanner, the totals are a message of their own
+        if self.level == VERBOSE:
+            for start, end, fill in extents:
+                self.write(f"Empty: {start}-{end} ({end - start} bytes of 0x{fill:02x})")
+        elif self.level == JSON:
+            for k in range(0, len(extents), EMPTY_BATCH):
+                self.event('empty', extents=extents[k:k + EMPTY_BATCH])
+
+    def stats(self, snapshot):
+        # called with the snapshots of the CarveProgress, the last one has phase "done"
+        if self.level == QUIET:
+            return
+        done = snapshot['phase'] == "done"
+        now = time.monotonic()
+        if not done and (not self.periodic or now - self.last < self.interval):
+            return
+        self.last = now
+        if self.level == JSON:
+            self.event('stats', **snapshot)
+            return
+        files = recovered(snapshot['hits'])
+        counts = ", ".join(f"{format} {count}" for format, count in files.items()) or "none"
+        if done:
+            self.write(f"{sum(files.values())} files recovered ({counts}) from {snapshot['done']} bytes in {snapshot['elapsed']}s ({snapshot['mb_per_s']} MB/s)")
+        else:
+            eta = f", ETA {int(snapshot['eta'])}s" if snapshot['eta'] is not None else ""
+            self.write(f"{snapshot['percent']:6.2f}% at {snapshot['mb_per_s']} MB/s{eta}, recovered: {counts}")
@@ -0,0 +1,61 @@
+from imageio import Window
+
+# top level boxes of MP4/MOV/3GP files (ISO 14496-12 and QuickTime), anything else means the file is over
+TOP_LEVEL_BOXES = {
+    b'ftyp', b'styp', b'moov', b'mdat', b'moof', b'mfra', b'free', b'skip', b'wide', b'pnot', b'pdin',
+    b'meta', b'uuid', b'sidx', b'ssix', b'prft', b'emsg', b'junk', b'PICT', b'beam', b'bloc', b'meco',
+}
+MEDIA_BOXES = {b'moov', b'moof', b'mdat'} #without one of these there is no video, just a ftyp
+CACHE_LIMIT = 65536
+
+
+class Mp4Walker:
+    def __init__(self, g):
+        self.window = Window(g)
+        self.cache = {} #box offset -> (end of the file, a media box was seen from there on)
+
+    def box(self, position):
+        header = self.window.read(position, 16)
+        if len(header) < 8:
+            return None, None
+        size = int.from_bytes(header[:4], 'big')
+        name = header[4:8]
+        if size == 1: #64-bit largesize right after the name
+            if len(header) < 16:
+                return None, None
+            size = int.from_bytes(header[8:16], 'big')
+            if size < 16:
+                return None, None
+        elif size < 8: #0 (box goes to the end of the file) can't be carved, smaller than the header is broken
+            return None, None
+        return size, name
+
+    def walk(self, start, limit):
+        # returns the end of the file starting at start, or 0 if it is not an mp4
+        size, name = self.box(start)
+        if name != b'ftyp':
+            return 0
+
+        visited = []
+        position = start
+        end, media = None, False
+        while end is None:
+            if position in self.cache: #another ftyp hit already walked the rest of this chain
+                end, media = self.cache[position]
+                break
+            size, name = self.box(position)
+            if name not in TOP_LEVEL_BOXES or position + size - start > limit:
+                end = position
+                break
+            visited.append((position, name))
+            position += size
+
+        for position, name in reversed(visited):
+            media = media or name in MEDIA_BOXES
+            self.cache[position] = (end, media)
+        if len(self.cache) > CACHE_LIMIT:
+            self.cache.clear()
+
+        if end - start <= 8 or not media:
+            return 0
+        return end
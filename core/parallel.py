@@ -0,0 +1,70 @@
+from multiprocessing import Pool
+from scanner import Scanner
+from strategies import STRATEGIES
+from sparse import Extents, EmptySpace
+from containers import open_image
+
+HEADER = 1 #at the same offset a footer closes a file before a header can open a new one
+FOOTER = 0
+
+worker = {} #per process state, created once by init_worker
+
+
+def init_worker(isopath, segment_size, holes, signatures):
+    # signatures: the formats carved, only their headers and footers are searched
+    worker['file'] = open_image(isopath) #every worker has its own block cache for the compressed images
+    worker['holes'] = holes
+    worker['signatures'] = signatures
+    worker['scanner'] = Scanner(signatures)
+    worker['footers'] = {format: signatures[format]['footer'] for format in signatures if STRATEGIES[signatures[format]['strategy']].carve is None}
+    overlap = max(len(signature) for sig in signatures.values() for signature in (sig['header'], sig['footer'])) - 1
+    worker['overlap'] = overlap
+    worker['buffer'] = bytearray(segment_size + overlap) #one buffer per process, reused for every segment
+
+
+def scan_segment(segment):
+    # returns the events (offset, kind, format) that start in [start, end), sorted by offset, and the empty extents
+    # of the segment (see sparse.py)
+    # every header is reported, but only the footers that can close a file: the first one after each position a file
+    # opened in a previous segment can have its footer search at (its header can end in this segment) and the first
+    # one after each header. Events at the same offset come in the order of the signatures, like in carve_sequential
+    start, end, continued = segment
+    hole = worker['holes'].at(start)
+    if hole is not None and hole[1] >= end: #nothing stored there, nothing to read
+        return start, end - start, [], [[start, end, 0]]
+    f, buffer = worker['file'], worker['buffer']
+    f.seek(start)
+    with memoryview(buffer) as view:
+        overlap = worker['overlap'] if continued else 0 #nothing straddles the end of a range of --unallocated
+        read = f.readinto(view[:end - start + overlap]) #the overlap lets signatures straddling the end be found here
+    length = min(end - start, read)
+
+    events = set()
+    headers = {}
+    empty = EmptySpace(limit=None) #bounded by the segment, the carve keeps the first MAX_EMPTY_EXTENTS of them
+    for offset, format in worker['scanner'].scan(buffer, 0, read, start, empty):
+        if offset < start + length:
+            events.add((offset, HEADER, format))
+            headers.setdefault(format, []).append(offset)
+
+    for format, footer in worker['footers'].items():
+        header_len = len(worker['signatures'][format]['header'])
+        for search_from in [start + k for k in range(header_len)] + [offset + header_len for offset in headers.get(format, [])]:
+            position = buffer.find(footer, search_from - start, read)
+            if position != -1 and position < length:
+                events.add((start + position, FOOTER, format))
+    order = worker['scanner'].order
+    return start, length, sorted(events, key=lambda event: (event[0], event[1], order[event[2]])), empty.clip(start, start + length)
+
+
+def scan_parallel(isopath, totalsize, segment_size, workers, signatures, start=0, holes=None, ranges=None):
+    # yields the events of every segment from start to the end of the image (or of the ranges, sparse.Extents)
+    # in image order, whatever the order the workers finish in
+    extents = ranges.extents if ranges is not None else [(0, totalsize)]
+    segments = []
+    for extent_start, extent_end in extents:
+        for offset in range(max(start, extent_start), extent_end, segment_size):
+            segments.append((offset, min(extent_end, offset + segment_size), offset + segment_size < extent_end))
+    with Pool(workers, initializer=init_worker, initargs=(isopath, segment_size, holes or Extents(), signatures)) as pool:
+        for result in pool.imap(scan_segment, segments):
+            yield result
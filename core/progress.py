@@ -0,0 +1,132 @@
+import time
+import threading
+
+PROGRESS_INTERVAL = 0.5 #seconds between two calls of the callback
+
+
+class Cancelled(Exception): #raised in the carve by the next update after cancel()
+    pass
+
+
+class CarveProgress:
+    # shared counters of a carve: carve() updates them, anyone can read snapshot() or get it through the callback
+    # (the web api streams it) or the Log of the carve (see log.py). With bar=True the counters also drive a tqdm bar.
+    def __init__(self, callback=None, interval=PROGRESS_INTERVAL, bar=False):
+        self.callback = callback
+        self.interval = interval
+        self.bar = bar
+        self.lock = threading.Lock()
+        self.phase = "starting"
+        self.total = 0
+        self.done = 0 #bytes scanned (or extracted when the files come from the hit index)
+        self.skipped = 0 #bytes done before this run started (resume), they don't count in the speed
+        self.started = time.monotonic()
+        self.ended = None
+        self.last = 0
+        self.local = threading.local()
+        self.counters = [] #one {(format, status): count} per thread that counts hits, added up by snapshot()
+        self.writer = None #the Writer and ReadAhead of the carve, for their queue depths
+        self.reader = None
+        self.empty = None #the EmptySpace of the carve, the wiped space it did not search
+        self.tqdm = None
+        self.log = None #set by carve()
+        self.cancelled = False
+
+    def start(self, total, phase="scanning"):
+        with self.lock:
+            self.phase = phase
+            self.total = total
+            self.done = self.skipped = 0
+            self.started = time.monotonic()
+            self.ended = None
+        if self.bar:
+            import tqdm
+            self.tqdm = tqdm.tqdm(total=total, unit='B', unit_scale=True)
+        self.report(force=True)
+
+    def skip(self, n):
+        # bytes already done by the carve we are resuming
+        with self.lock:
+            self.done += n
+            self.skipped += n
+        if self.tqdm is not None:
+            self.tqdm.update(n)
+
+    def cancel(self):
+        # the carve stops at its next update, between two buffers, and its checkpoint stays so it can be resumed
+        self.cancelled = True
+
+    def update(self, n):
+        if self.cancelled:
+            raise Cancelled()
+        self.done += n #only the thread of the carve counts the bytes, snapshot() just reads them
+        if self.tqdm is not None:
+            self.tqdm.update(n)
+        self.report()
+
+    def hit(self, format, status):
+        # no lock on the way of every hit: each thread counts in its own dict, the lock is only taken once to add it
+        counts = getattr(self.local, 'counts', None)
+        if counts is None:
+            counts = self.local.counts = {}
+            with self.lock:
+                self.counters.append(counts)
+        key = (format, status)
+        counts[key] = counts.get(key, 0) + 1
+
+    def hits(self):
+        # format -> status -> count, see hitindex.py for the statuses
+        with self.lock:
+            counters = list(self.counters)
+        hits = {}
+        for counts in counters:
+            for (format, status), count in counts.copy().items(): #copy() is atomic, the thread can go on counting
+                by_status = hits.setdefault(format, {})
+                by_status[status] = by_status.get(status, 0) + count
+        return hits
+
+    def finish(self):
+        with self.lock:
+            self.phase = "done"
+            self.ended = time.monotonic()
+        if self.tqdm is not None:
+            self.tqdm.close()
+        self.report(force=True)
+
+    def snapshot(self):
+        hits = self.hits()
+        with self.lock:
+            elapsed = (self.ended or time.monotonic()) - self.started
+            speed = (self.done - self.skipped) / elapsed if elapsed > 0 else 0
+            snapshot = {
+                'phase': self.phase,
+                'total': self.total,
+                'done': self.done,
+                'percent': round(self.done * 100 / self.total, 2) if self.total else 0,
+                'elapsed': round(elapsed, 1),
+                'mb_per_s': round(speed / (1024*1024), 2),
+                'eta': round((self.total - self.done) / speed, 1) if speed > 0 else None,
+                'hits': hits,
+            }
+        if self.writer is not None:
+            snapshot['write_queue'] = self.writer.jobs.qsize()
+            snapshot['write_queue_bytes'] = self.writer.queued
+            snapshot['written_bytes'] = self.writer.written
+        if self.reader is not None:
+            snapshot['read_ahead'] = self.reader.ready.qsize()
+        if self.empty is not None:
+            snapshot['empty_bytes'] = self.empty.bytes
+        return snapshot
+
+    def report(self, force=False):
+        if self.callback is None and self.log is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.last < self.interval:
+            return
+        self.last = now
+        snapshot = self.snapshot()
+        if self.callback is not None:
+            self.callback(snapshot)
+        if self.log is not None:
+            self.log.stats(snapshot)
@@ -0,0 +1,101 @@
+import os
+import queue
+import threading
+
+READ_AHEAD = 1 #buffers read in advance while the current one is scanned (1 = double buffering)
+
+
+class ReadAhead:
+    # reads the image sequentially in a background thread into a ring of reusable buffers, so the disk keeps reading
+    # while the scanner searches the previous buffer; every buffer leaves `front` free bytes at the beginning,
+    # where the scan loop puts the end of the previous buffer (the OVERLAP). The holes of a sparse image
+    # (sparse.Extents) are not read, their part of the buffer is filled with zeros. With ranges (Extents too) only
+    # those are read, a buffer never spans two of them
+    def __init__(self, f, buffer_size, front=0, depth=READ_AHEAD, holes=None, ranges=None):
+        self.f = f
+        self.buffer_size = buffer_size
+        self.front = front
+        self.position = f.tell()
+        self.holes = holes
+        self.ranges = ranges
+        self.zeros = bytes(buffer_size) if holes else None
+        self.free = queue.Queue()
+        self.ready = queue.Queue()
+        self.stopped = False
+        # depth buffers in flight and the one being scanned, at least two because the scan loop still needs
+        # the end of the previous buffer when it gets the next one
+        for _ in range(max(depth, 1) + 1):
+            self.free.put(bytearray(front + buffer_size))
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL) #bigger kernel readahead on this file
+            except OSError:
+                pass
+        self.thread = None
+        if depth > 0:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def fill(self, buffer):
+        size = self.buffer_size
+        if self.ranges is not None:
+            position, size = self.ranges.next(self.position, size)
+            if position != self.position:
+                self.f.seek(position)
+                self.position = position
+            if not size: #after the last range
+                return self.position, buffer, 0
+        hole = self.holes.at(self.position) if self.holes else None
+        if hole is not None:
+            size = min(size, hole[1] - self.position)
+            with memoryview(buffer) as view, memoryview(self.zeros) as zeros:
+                view[self.front:self.front + size] = zeros[:size]
+            self.f.seek(self.position + size)
+            self.position += size
+            return self.position - size, buffer, size
+        if self.holes:
+            next_hole = self.holes.after(self.position)
+            if next_hole is not None:
+                size = min(size, next_hole - self.position) #the read stops where the hole begins
+        with memoryview(buffer) as view:
+            read = self.f.readinto(view[self.front:self.front + size])
+        position = self.position
+        self.position += read
+        return position, buffer, read
+
+    def run(self):
+        while True:
+            buffer = self.free.get()
+            if buffer is None or self.stopped:
+                return
+            try:
+                result = self.fill(buffer)
+            except OSError as e:
+                self.ready.put(e)
+                return
+            self.ready.put(result)
+            if not result[2]: #end of the image
+                return
+
+    def next(self):
+        # returns (absolute offset of the data, buffer, bytes read), the data is at buffer[front:front+read]
+        if self.thread is None:
+            return self.fill(self.free.get())
+        result = self.ready.get()
+        if isinstance(result, OSError):
+            raise result
+        return result
+
+    def release(self, buffer):
+        self.free.put(buffer) #the buffer can be filled again
+
+    def close(self):
+        # stops the thread, even blocked on a full ring (waiting for a free buffer), and lets the buffers go:
+        # the CarveProgress of a web job keeps this object after the carve
+        self.stopped = True
+        self.free.put(None)
+        if self.thread is not None:
+            self.thread.join()
+        for ring in (self.free, self.ready):
+            while not ring.empty():
+                ring.get_nowait()
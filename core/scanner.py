@@ -0,0 +1,75 @@
+from signatures import SIGNATURES
+
+SCAN_BLOCK = 256*1024 #the buffer is scanned in blocks that fit in the CPU cache, so every byte comes from RAM only once
+
+
+def build_dispatch_table(signatures):
+    # every header is grouped under the shortest header that is a prefix of it (office_new starts with the zip header),
+    # so shared prefixes are searched only once and the hit is dispatched to every format of the group
+    headers = {}
+    for format in signatures:
+        headers.setdefault(signatures[format]['header'], []).append(format)
+
+    table = {}
+    for header in sorted(headers, key=len):
+        anchor = header
+        for candidate in table:
+            if header.startswith(candidate):
+                anchor = candidate
+                break
+        table.setdefault(anchor, []).append((header, headers[header]))
+    return table
+
+
+class Scanner:
+    def __init__(self, signatures=SIGNATURES, block_size=SCAN_BLOCK):
+        self.signatures = signatures
+        self.block_size = block_size
+        self.table = build_dispatch_table(signatures)
+        self.order = {format: n for n, format in enumerate(signatures)} #used to keep hits at the same offset in a stable order
+        self.max_header = max(len(sig['header']) for sig in signatures.values()) if signatures else 0
+        self.runs = {} #fill byte -> block_size bytes of it
+
+    def constant(self, data, start, end):
+        # returns the byte every position of data[start:end] holds, or None
+        fill = data[start]
+        if data[end - 1] != fill or data[(start + end) // 2] != fill: #real data fails here, before any copy
+            return None
+        run = self.runs.get(fill)
+        if run is None:
+            run = self.runs[fill] = bytes([fill]) * self.block_size
+        if data[start:end] != (run if end - start == self.block_size else run[:end - start]):
+            return None
+        return fill
+
+    def scan(self, data, start=0, end=None, base=0, empty=None):
+        # returns [(absolute_offset, format)] for every header that lies entirely in data[start:end], sorted by offset
+        # data can be anything with a find(sub, start, end) method: bytes, bytearray or mmap
+        # empty: a sparse.EmptySpace, the blocks holding a single byte value are added to it instead of being searched
+        size = len(data)
+        if end is None or end > size:
+            end = size
+        hits = []
+        block_start = start
+        while block_start < end:
+            block_end = min(end, block_start + self.block_size)
+            search_from = block_start
+            if empty is not None:
+                fill = self.constant(data, block_start, block_end)
+                if fill is not None:
+                    empty.add(base + block_start, base + block_end, fill)
+                    search_from = max(block_start, block_end - self.max_header + 1) #only the headers that end in the next block
+            block_hits = []
+            for anchor, group in self.table.items():
+                limit = min(end, block_end + len(anchor) - 1) #a header can begin in this block and end in the next one
+                position = data.find(anchor, search_from, limit)
+                while position != -1:
+                    for header, formats in group:
+                        if len(header) == len(anchor) or (position + len(header) <= end and data[position:position + len(header)] == header):
+                            for format in formats:
+                                block_hits.append((base + position, self.order[format], format))
+                    position = data.find(anchor, position + 1, limit)
+            block_hits.sort()
+            hits.extend((offset, format) for offset, _, format in block_hits)
+            block_start = block_end
+        return hits
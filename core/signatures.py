@@ -3,13 +3,13 @@ SIGNATURES = {
         'header': b'\xff\xd8\xff',
         'footer': b'\xff\xd9',
         'extension': 'jpg',
-        'strategy': 'header_footer'
+        'strategy': 'validate_jpeg' # the footer is not used, the structure of the file says where it ends
     },
     'png': {
         'header': b'\x89\x50\x4e\x47\x0d\x0a\x1a\x0a',
         'footer': b'\x49\x45\x4e\x44\xae\x42\x60\x82',
         'extension': 'png',
-        'strategy': 'header_footer'
+        'strategy': 'validate_png' # the footer is not used, the structure of the file says where it ends
     },
     'pdf': {
         'header': b'\x25\x50\x44\x46',
@@ -21,7 +21,7 @@ SIGNATURES = {
         'header': b'\x47\x49\x46\x38\x39\x61', 
         'footer': b'\x00\x3b',
         'extension': 'gif',
-        'strategy': 'header_footer'
+        'strategy': 'validate_gif' # the footer is not used, the structure of the file says where it ends
     },
     'zip': {
     'header': b'\x50\x4b\x03\x04',
@@ -35,10 +35,10 @@ SIGNATURES = {
         'extension': 'mp4',
         'strategy': 'carve_mp4'
     },
-    'office_new': { # that thing is exactly like a zip , but can be a xlsx and a pptx too
+    'office_new': { # that thing is exactly like a zip , but can be a xlsx and a pptx too (the zip carver tells them apart)
         'header': b'\x50\x4b\x03\x04\x14\x00\x06\x00',
         'footer': b'\x50\x4b\x05\x06',
         'extension': 'docx',
-        'strategy': 'header_footer'
+        'strategy': 'carve_zip'
     }
 }
\ No newline at end of file
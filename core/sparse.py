@@ -0,0 +1,99 @@
+import os
+import errno
+from bisect import bisect_right
+
+MAX_EMPTY_EXTENTS = 10000 #extents kept for the log, a wiped disk with scattered data has millions, the others are only counted
+
+
+class Extents:
+    # sorted, non overlapping [(start, end)] ranges of the image: the holes of a sparse image (the filesystem
+    # stores nothing for them, they read as zeros) or the unallocated space to scan (see unallocated.py)
+    def __init__(self, extents=()):
+        self.extents = list(extents)
+        self.starts = [start for start, _ in self.extents]
+
+    def __len__(self):
+        return len(self.extents)
+
+    def total(self):
+        return sum(end - start for start, end in self.extents)
+
+    def before(self, offset):
+        # bytes of the extents below offset
+        n = bisect_right(self.starts, offset)
+        return sum(min(end, offset) - start for start, end in self.extents[:n])
+
+    def at(self, offset):
+        # the extent offset is in, or None
+        n = bisect_right(self.starts, offset) - 1
+        if n >= 0 and offset < self.extents[n][1]:
+            return self.extents[n]
+        return None
+
+    def after(self, offset):
+        # start of the first extent after offset, or None
+        n = bisect_right(self.starts, offset)
+        return self.starts[n] if n < len(self.starts) else None
+
+    def next(self, offset, size):
+        # (offset, size) of the next read of at most size bytes inside the extents, from offset or the first extent
+        # after it; size is 0 when there is nothing left
+        extent = self.at(offset)
+        if extent is None:
+            start = self.after(offset)
+            if start is None:
+                return offset, 0
+            offset, extent = start, self.at(start)
+        return offset, min(size, extent[1] - offset)
+
+
+def find_holes(fd, size):
+    # the holes as Extents, asking the filesystem with SEEK_HOLE/SEEK_DATA; none when it can't tell (block devices,
+    # other systems). Moves the file offset of fd, the caller seeks where it wants afterwards
+    if not hasattr(os, 'SEEK_HOLE'):
+        return Extents()
+    extents = []
+    position = 0
+    try:
+        while position < size:
+            hole = os.lseek(fd, position, os.SEEK_HOLE)
+            if hole >= size:
+                break
+            try:
+                data = os.lseek(fd, hole, os.SEEK_DATA)
+            except OSError as e:
+                if e.errno != errno.ENXIO:
+                    raise
+                data = size #the image ends with a hole
+            extents.append((hole, min(data, size)))
+            position = data
+    except OSError:
+        return Extents()
+    return Extents(extents)
+
+
+class EmptySpace:
+    # the extents the scanner skipped because every byte in them is the same (wiped or never written space,
+    # holes of sparse images), filled by Scanner.scan in image order
+    def __init__(self, limit=MAX_EMPTY_EXTENTS):
+        self.extents = [] #[start, end, fill byte], adjacent extents with the same fill are merged
+        self.limit = limit #the extents after the first limit are counted but not kept, None keeps them all
+        self.count = 0
+        self.bytes = 0
+        self.last = None #the last extent, kept or not, the next one can be merged with it
+
+    def add(self, start, end, fill):
+        last = self.last
+        if last is not None and start <= last[1] and fill == last[2]:
+            self.bytes += max(0, end - last[1])
+            last[1] = max(last[1], end)
+        else:
+            self.last = [start, end, fill]
+            self.count += 1
+            self.bytes += end - start
+            if self.limit is None or len(self.extents) < self.limit:
+                self.extents.append(self.last)
+
+    def clip(self, start, end):
+        # the extents inside [start, end)
+        return [[max(s, start), min(e, end), fill] for s, e, fill in self.extents if s < end and e > start]
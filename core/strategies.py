@@ -0,0 +1,140 @@
+import os
+from signatures import SIGNATURES
+from zipcarve import walk_zip
+from mp4carve import Mp4Walker
+from validators import VALIDATORS
+from hitindex import CARVED, SKIPPED
+
+LIMIT_SECURITY = 400*1024*1024 #limiting the search to 400MB because i don't wanna to have a disaster
+HEADER_FOOTER = 'header_footer'
+
+STRATEGIES = {} #the 'strategy' of a signature -> Strategy, see register
+
+
+class Strategy:
+    # how the files of a format are carved from a header the scanner found: carve(carver, i, format, start) writes
+    # the file starting at start with carver.extract and returns where it ends, or 0 if there is no file there.
+    # header_footer has no carve, the scan loops keep its files open until their footer goes by
+    def __init__(self, carve=None, offset=0, family=False, folder=None):
+        self.carve = carve
+        self.offset = offset #where the file starts from its header, the ftyp of an mp4 is 4 bytes in
+        self.family = family #the formats of this strategy are the same files: no header of one is searched inside a file of another
+        self.folder = folder #folder(format, extension) the files go in, the name of the format if None
+
+
+def register(name, carve=None, offset=0, family=False, folder=None):
+    # a new format only needs its signature in signatures.py, with the name of its strategy, and the strategy here
+    STRATEGIES[name] = Strategy(carve, offset, family, folder)
+
+
+def select(formats=None):
+    # the signatures of the formats to carve (names of SIGNATURES, all of them if None), in the order of SIGNATURES
+    # so the files of a selection are found the same way as in a full carve. A format of a family brings the others:
+    # a docx is found by the zip header as often as by its own
+    for format, signature in SIGNATURES.items():
+        if signature['strategy'] not in STRATEGIES:
+            raise ValueError(f"The strategy {signature['strategy']} of {format} is not registered")
+    if formats is None:
+        return SIGNATURES
+    unknown = [format for format in formats if format not in SIGNATURES]
+    if not formats:
+        raise ValueError(f"No format selected, the formats are {', '.join(SIGNATURES)}")
+    if unknown:
+        raise ValueError(f"Unknown format {', '.join(unknown)}, the formats are {', '.join(SIGNATURES)}")
+    families = {SIGNATURES[format]['strategy'] for format in formats if strategy_of(format).family}
+    return {format: signature for format, signature in SIGNATURES.items() if format in formats or signature['strategy'] in families}
+
+
+def strategy_of(format):
+    return STRATEGIES[SIGNATURES[format]['strategy']]
+
+
+def output_format(format, extension):
+    # the format a file is recovered as, not always the one of its header: a docx found by the zip header is office_new
+    if format in SIGNATURES and strategy_of(format).folder is not None:
+        return strategy_of(format).folder(format, extension or SIGNATURES[format]['extension'])
+    return format
+
+
+def restored_path(outpath, format, i, extension):
+    return os.path.join(outpath, output_format(format, extension), f"restored_{i}.{extension}")
+
+
+class Carver:
+    # what the strategies of one carve write with: the image (source), the writer and the hit index,
+    # plus what a strategy keeps from one file to the next (state). formats: the formats asked for, None for all,
+    # a family brings the others in the scan but their files are not written (a plain zip when only office_new is asked)
+    def __init__(self, outpath, source, writer, index, formats=None):
+        self.outpath = outpath
+        self.source = source
+        self.writer = writer
+        self.index = index
+        self.formats = formats
+        self.skipped = False #the last file was not written, its format was not asked for
+        self.state = {}
+        self.folders = set()
+
+    def extract(self, i, format, start, end, extension=None):
+        # every strategy ends here: the file is queued for writing and recorded in the hit index
+        extension = extension or SIGNATURES[format]['extension']
+        recovered_as = output_format(format, extension)
+        if self.formats is not None and recovered_as not in self.formats:
+            self.index.add(start, format, end - start, SKIPPED) #not a recovered file, but the headers inside it are still skipped
+            self.skipped = True
+            return
+        path = restored_path(self.outpath, format, i, extension)
+        folder = os.path.dirname(path)
+        if folder not in self.folders: #a strategy can write outside the folder of its format (docx found as zip)
+            os.makedirs(folder, exist_ok=True)
+            self.folders.add(folder)
+        self.writer.write(start, end - start, path)
+        self.index.add(start, format, end - start, CARVED, i, extension, counted_as=recovered_as)
+
+
+def carve_zip(carver, i, format, start):
+    # the archive is walked header by header (see zipcarve.py), so we only read the bytes it really spans
+    archive = walk_zip(carver.source, start, LIMIT_SECURITY)
+    if archive is None:
+        return 0
+    end, extension = archive
+    carver.extract(i, format, start, end, extension)
+    return end
+
+
+def zip_folder(format, extension):
+    if format not in ("zip", "office_new"):
+        return format
+    return "zip" if extension == "zip" else "office_new" #docx, xlsx and pptx are zips too, but they go with the office files
+
+
+def carve_mp4(carver, i, format, start):
+    # the boxes are walked by the Mp4Walker (see mp4carve.py), the whole file is written in one go
+    walker = carver.state.get('mp4')
+    if walker is None:
+        walker = carver.state['mp4'] = Mp4Walker(carver.source)
+    try:
+        end = walker.walk(start, LIMIT_SECURITY)
+    except OSError as e:
+        carver.writer.log.error(f"carving the mp4 file at {start}: {e}")
+        return 0
+    if end:
+        carver.extract(i, format, start, end)
+    return end
+
+
+def validated(validate):
+    # a strategy from a validator (see validators.py): the file is parsed from its header to its real end,
+    # nothing is written for non-files
+    def carve(carver, i, format, start):
+        end = validate(carver.source, start, LIMIT_SECURITY)
+        if end:
+            carver.extract(i, format, start, end)
+        return end
+    return carve
+
+
+register(HEADER_FOOTER)
+register('carve_zip', carve_zip, family=True, folder=zip_folder)
+register('carve_mp4', carve_mp4, offset=-4) #the headers of mp4 files are 4 bytes before ftyp
+for name, validate in VALIDATORS.items():
+    register(name, validated(validate))
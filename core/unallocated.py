@@ -0,0 +1,367 @@
+import re
+import struct
+from imageio import read_at
+from sparse import Extents
+
+# --unallocated: the allocation maps of the filesystems of the image say which clusters are free, only those
+# (and the space no known filesystem accounts for) are scanned. Every offset stays image-absolute.
+
+SECTOR = 512
+FAT_CHUNK = 4*1024*1024 #fat entries handled at a time, a FAT32 table can be hundreds of MB
+EXTENDED = (0x05, 0x0f, 0x85) #extended partitions, the logical partitions inside are not followed
+FAT32_HIGH = bytes(byte & 0x0f for byte in range(256)) #the 4 high bits of a fat32 entry are reserved
+
+
+def merge(extents):
+    # sorted (start, end) extents with the overlapping and touching ones joined
+    merged = []
+    for start, end in sorted(extents):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        elif end > start:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def add_run(runs, first, number):
+    if runs and runs[-1][0] + runs[-1][1] == first:
+        runs[-1][1] += number
+    else:
+        runs.append([first, number])
+
+
+def free_bits(bitmap, runs, base=0):
+    # adds to runs the (first, number) runs of clear bits of an allocation bitmap, least significant bit first;
+    # whole free bytes are found by the regex engine, only the bytes half used are looked at bit by bit
+    for match in re.finditer(rb'\x00+|[^\x00\xff]', bitmap):
+        start, end = match.span()
+        byte = bitmap[start]
+        if byte == 0:
+            add_run(runs, base + start*8, (end - start)*8)
+        else:
+            for bit in range(8):
+                if not byte >> bit & 1:
+                    add_run(runs, base + start*8 + bit, 1)
+    return runs
+
+
+def clip_runs(runs, count):
+    # the runs below count (a bitmap is rounded up to whole bytes or blocks)
+    return [(first, min(number, count - first)) for first, number in runs if first < count]
+
+
+def cluster_extents(runs, heap, cluster_size, first_cluster=0):
+    # runs of clusters to image offsets, heap: offset of cluster first_cluster
+    return [(heap + (first - first_cluster)*cluster_size, heap + (first - first_cluster + number)*cluster_size) for first, number in runs]
+
+
+def parse_fat(g, offset):
+    boot = read_at(g, offset, SECTOR)
+    if len(boot) < SECTOR or boot[510:512] != b'\x55\xaa':
+        return None
+    if boot[82:90] == b'FAT32   ':
+        filesystem, entry = 'fat32', 4
+    elif boot[54:62] == b'FAT16   ':
+        filesystem, entry = 'fat16', 2
+    else:
+        return None #fat12 is only found on floppies
+    bps, spc, reserved, fats, root_entries, total16, _, fat16 = struct.unpack_from('<HBHBHHBH', boot, 11)
+    total32, fat32 = struct.unpack_from('<II', boot, 32)
+    if bps not in (512, 1024, 2048, 4096) or not spc or spc & (spc - 1) or not fats:
+        return None
+    total = total16 or total32
+    fat_size = fat16 if entry == 2 else fat32
+    data = reserved + fats*fat_size + (root_entries*32 + bps - 1) // bps #fat32 has no fixed root directory
+    count = (total - data) // spc
+    if count <= 0:
+        return None
+
+    # every cluster is one byte of `used`, 0 when its fat entry is 0 (free); the columns of the entries are ORed
+    # together as big integers so nothing is done entry by entry in python
+    runs = []
+    fat_start = offset + reserved*bps
+    for first in range(2, count + 2, FAT_CHUNK):
+        number = min(FAT_CHUNK, count + 2 - first)
+        entries = read_at(g, fat_start + first*entry, number*entry)
+        if len(entries) < number*entry:
+            return None
+        columns = [entries[k::entry] for k in range(entry)]
+        if entry == 4:
+            columns[3] = columns[3].translate(FAT32_HIGH)
+        used = 0
+        for column in columns:
+            used |= int.from_bytes(column, 'little')
+        for match in re.finditer(rb'\x00+', used.to_bytes(number, 'little')):
+            add_run(runs, first + match.start(), match.end() - match.start())
+    cluster_size = spc*bps
+    return {
+        'filesystem': filesystem,
+        'offset': offset,
+        'size': total*bps,
+        'cluster_size': cluster_size,
+        'free': cluster_extents(runs, offset + data*bps, cluster_size, 2),
+    }
+
+
+def parse_exfat(g, offset):
+    boot = read_at(g, offset, SECTOR)
+    if len(boot) < SECTOR or boot[3:11] != b'EXFAT   ':
+        return None
+    volume_length, fat_offset, fat_length, heap_offset, count, root_cluster = struct.unpack_from('<QIIIII', boot, 72)
+    active = struct.unpack_from('<H', boot, 106)[0] & 1 #the fat and bitmap in use when there are two
+    bps = 1 << boot[108]
+    cluster_size = bps << boot[109]
+    fat_start = offset + (fat_offset + active*fat_length)*bps
+    heap = offset + heap_offset*bps
+
+    def chain(first):
+        # the clusters of a directory or of the bitmap, from the fat
+        cluster = first
+        for _ in range(count):
+            if cluster < 2 or cluster >= count + 2:
+                return
+            yield cluster
+            following = struct.unpack('<I', read_at(g, fat_start + cluster*4, 4))[0]
+            cluster = cluster + 1 if following == 0 else following #0: written without a fat chain, contiguous
+
+    bitmap = kind = None
+    for cluster in chain(root_cluster):
+        directory = read_at(g, heap + (cluster - 2)*cluster_size, cluster_size)
+        for at in range(0, len(directory), 32):
+            kind = directory[at]
+            if kind == 0: #end of the directory
+                break
+            if kind == 0x81 and directory[at + 1] & 1 == active: #the allocation bitmap
+                bitmap = struct.unpack_from('<IQ', directory, at + 20)
+                break
+        if bitmap is not None or kind == 0:
+            break
+    if bitmap is None:
+        return None
+
+    first, length = bitmap
+    data = bytearray()
+    for cluster in chain(first):
+        data += read_at(g, heap + (cluster - 2)*cluster_size, cluster_size)
+        if len(data) >= length:
+            break
+    if len(data) < (count + 7) // 8:
+        return None
+    runs = clip_runs(free_bits(bytes(data[:length]), []), count)
+    return {
+        'filesystem': 'exfat',
+        'offset': offset,
+        'size': volume_length*bps,
+        'cluster_size': cluster_size,
+        'free': cluster_extents(runs, heap, cluster_size), #bit 0 is cluster 2, the first of the heap
+    }
+
+
+def has_backup(group, sparse_super):
+    # sparse_super keeps the superblock backups in groups 0, 1 and the powers of 3, 5 and 7 only
+    if not sparse_super or group < 2:
+        return True
+    for base in (3, 5, 7):
+        power = base
+        while power < group:
+            power *= base
+        if power == group:
+            return True
+    return False
+
+
+def parse_ext(g, offset):
+    superblock = read_at(g, offset + 1024, 1024)
+    if len(superblock) < 1024 or struct.unpack_from('<H', superblock, 56)[0] != 0xef53:
+        return None
+    blocks, first_data_block, log_block_size, _, blocks_per_group = struct.unpack_from('<I12xIIII', superblock, 4)
+    incompat, ro_compat = struct.unpack_from('<4xII', superblock, 0x5c)
+    if incompat & 0x10 or ro_compat & 0x200: #meta_bg moves the group descriptors, bigalloc maps clusters and not blocks
+        return None
+    desc_size = 32
+    if incompat & 0x80: #64bit
+        blocks |= struct.unpack_from('<I', superblock, 0x150)[0] << 32
+        desc_size = max(32, struct.unpack_from('<H', superblock, 0xfe)[0])
+    block_size = 1024 << log_block_size
+    if not blocks_per_group or blocks <= first_data_block:
+        return None
+    groups = (blocks - first_data_block + blocks_per_group - 1) // blocks_per_group
+    inodes_per_group = struct.unpack_from('<I', superblock, 40)[0]
+    inode_size = struct.unpack_from('<H', superblock, 88)[0] if struct.unpack_from('<I', superblock, 76)[0] else 128
+    backup_blocks = 1 + (groups*desc_size + block_size - 1) // block_size + struct.unpack_from('<H', superblock, 0xce)[0] #superblock, descriptors, reserved descriptors
+    descriptors = read_at(g, offset + (first_data_block + 1)*block_size, groups*desc_size)
+    if len(descriptors) < groups*desc_size:
+        return None
+
+    runs = []
+    for group in range(groups):
+        at = group*desc_size
+        bitmap_block, inode_bitmap, inode_table = struct.unpack_from('<III', descriptors, at)
+        if desc_size >= 64:
+            high = struct.unpack_from('<III', descriptors, at + 0x20)
+            bitmap_block, inode_bitmap, inode_table = (low | high << 32 for low, high in zip((bitmap_block, inode_bitmap, inode_table), high))
+        flags = struct.unpack_from('<H', descriptors, at + 0x12)[0]
+        first = first_data_block + group*blocks_per_group
+        number = min(blocks_per_group, blocks - first)
+        if flags & 0x2:
+            # BLOCK_UNINIT: the bitmap was never written, only the metadata in the group is used (like the kernel computes it)
+            bitmap = bytearray((number + 7) // 8)
+            used = [(inode_bitmap, 1), (bitmap_block, 1), (inode_table, (inodes_per_group*inode_size + block_size - 1) // block_size)]
+            if has_backup(group, ro_compat & 0x1):
+                used.append((first, backup_blocks))
+            for start, count in used:
+                for block in range(max(start, first), min(start + count, first + number)):
+                    bitmap[(block - first) // 8] |= 1 << (block - first) % 8
+        else:
+            bitmap = read_at(g, offset + bitmap_block*block_size, (number + 7) // 8)
+        for run_first, run_number in clip_runs(free_bits(bitmap, []), number):
+            add_run(runs, first + run_first, run_number)
+    return {
+        'filesystem': 'ext',
+        'offset': offset,
+        'size': blocks*block_size,
+        'cluster_size': block_size,
+        'free': cluster_extents(runs, offset, block_size),
+    }
+
+
+def data_runs(record, at, end):
+    # the (lcn, clusters) runs of a non resident attribute, lcn is None for the sparse runs
+    runs = []
+    lcn = 0
+    while at < end and record[at]:
+        length_size, offset_size = record[at] & 0x0f, record[at] >> 4
+        length = int.from_bytes(record[at + 1:at + 1 + length_size], 'little')
+        delta = int.from_bytes(record[at + 1 + length_size:at + 1 + length_size + offset_size], 'little', signed=True)
+        at += 1 + length_size + offset_size
+        if offset_size:
+            lcn += delta
+            runs.append((lcn, length))
+        else:
+            runs.append((None, length))
+    return runs
+
+
+def parse_ntfs(g, offset):
+    boot = read_at(g, offset, SECTOR)
+    if len(boot) < SECTOR or boot[3:11] != b'NTFS    ':
+        return None
+    bps, spc = struct.unpack_from('<HB', boot, 11)
+    if spc > 0x80:
+        spc = 1 << (256 - spc)
+    total_sectors, mft_lcn = struct.unpack_from('<QQ', boot, 40)
+    cluster_size = bps*spc
+    record_size = struct.unpack_from('<b', boot, 64)[0]
+    record_size = 1 << -record_size if record_size < 0 else record_size*cluster_size
+    if not cluster_size or not record_size:
+        return None
+
+    # $Bitmap is record 6 of the MFT, always in the first run of the MFT
+    record = bytearray(read_at(g, offset + mft_lcn*cluster_size + 6*record_size, record_size))
+    if record[:4] != b'FILE':
+        return None
+    usa_offset, usa_count = struct.unpack_from('<HH', record, 4)
+    usn = record[usa_offset:usa_offset + 2]
+    for k in range(1, usa_count): #the last two bytes of every 512 are in the update sequence array
+        if record[k*512 - 2:k*512] != usn:
+            return None
+        record[k*512 - 2:k*512] = record[usa_offset + 2*k:usa_offset + 2*k + 2]
+
+    at = struct.unpack_from('<H', record, 20)[0]
+    runs = size = None
+    while at + 16 <= len(record):
+        kind, length = struct.unpack_from('<II', record, at)
+        if kind == 0xffffffff or not length:
+            break
+        if kind == 0x80 and record[at + 8] and not record[at + 9]: #the unnamed non resident $DATA
+            runlist, size = struct.unpack_from('<H', record, at + 32)[0], struct.unpack_from('<Q', record, at + 48)[0]
+            runs = data_runs(record, at + runlist, at + length)
+            break
+        at += length
+    if runs is None:
+        return None #an $ATTRIBUTE_LIST, the $Bitmap is too fragmented for its record
+
+    bitmap = bytearray()
+    for lcn, clusters in runs:
+        if lcn is None:
+            bitmap += bytes(clusters*cluster_size)
+        else:
+            bitmap += read_at(g, offset + lcn*cluster_size, clusters*cluster_size)
+    count = total_sectors // spc
+    if len(bitmap) < min(size, (count + 7) // 8):
+        return None
+    free = clip_runs(free_bits(bytes(bitmap[:size]), []), count)
+    return {
+        'filesystem': 'ntfs',
+        'offset': offset,
+        'size': total_sectors*bps,
+        'cluster_size': cluster_size,
+        'free': cluster_extents(free, offset, cluster_size),
+    }
+
+
+FILESYSTEMS = (parse_ntfs, parse_exfat, parse_fat, parse_ext)
+
+
+def volume_at(g, offset):
+    # the filesystem starting at offset, None when it is not one we know (or its maps don't make sense)
+    for parse in FILESYSTEMS:
+        try:
+            volume = parse(g, offset)
+        except (struct.error, ValueError, IndexError, OSError):
+            volume = None
+        if volume is not None:
+            return volume
+    return None
+
+
+def partitions(g, size):
+    # (start, end) of the partitions of the MBR or GPT of the image, [] when it has none
+    mbr = read_at(g, 0, SECTOR)
+    if len(mbr) < SECTOR or mbr[510:512] != b'\x55\xaa':
+        return []
+    found = []
+    for k in range(4):
+        kind, lba, sectors = struct.unpack_from('<4xB3xII', mbr, 446 + 16*k)
+        if kind == 0xee: #protective mbr, the partitions are in the gpt
+            return gpt_partitions(g, size)
+        if kind and kind not in EXTENDED and lba and sectors:
+            found.append((lba*SECTOR, min(size, (lba + sectors)*SECTOR)))
+    return [(start, end) for start, end in found if start < end]
+
+
+def gpt_partitions(g, size):
+    for sector in (512, 4096): #the gpt header is in the second sector, 4Kn disks have bigger ones
+        header = read_at(g, sector, 92)
+        if header[:8] != b'EFI PART':
+            continue
+        entries_lba, count, entry_size = struct.unpack_from('<QII', header, 72)
+        entries = read_at(g, entries_lba*sector, count*entry_size)
+        found = []
+        for at in range(0, len(entries) - entry_size + 1, entry_size):
+            if entries[at:at + 16] == bytes(16): #unused entry
+                continue
+            first, last = struct.unpack_from('<QQ', entries, at + 32)
+            if first <= last:
+                found.append((first*sector, min(size, (last + 1)*sector)))
+        return [(start, end) for start, end in found if start < end]
+    return []
+
+
+def unallocated(g, size):
+    # returns (Extents to scan, volumes found), the Extents are None when no filesystem of the image is known
+    # and everything has to be scanned. Unknown partitions and the space outside the partitions are scanned.
+    volume = volume_at(g, 0)
+    volumes = [volume] if volume else [volume_at(g, start) for start, end in partitions(g, size)]
+    volumes = [volume for volume in volumes if volume]
+    if not volumes:
+        return None, []
+    scan = []
+    position = 0
+    for volume in sorted(volumes, key=lambda volume: volume['offset']):
+        if volume['offset'] > position:
+            scan.append((position, volume['offset']))
+        scan.extend(volume['free'])
+        position = max(position, volume['offset'] + volume['size'])
+    scan.append((position, size))
+    return Extents(merge((start, min(end, size)) for start, end in scan if start < size)), volumes
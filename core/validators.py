@@ -0,0 +1,164 @@
+import re
+import zlib
+from struct import unpack_from
+from imageio import Window, read_at
+
+SCAN_CHUNK = 1024*1024 #entropy coded data and big PNG chunks are read 1MB at a time
+
+# inside JPEG entropy coded data a 0xFF is followed by 0x00 (stuffing), a restart marker or more 0xFF (fill),
+# anything else is a real marker
+JPEG_MARKER = re.compile(b'\xff[^\x00\xd0-\xd7\xff]')
+JPEG_STANDALONE = set(range(0xd0, 0xd8)) | {0x01} #markers without a length field
+JPEG_FRAMES = set(range(0xc0, 0xd0)) - {0xc4, 0xc8, 0xcc} #SOF0..SOF15, the others in that range are tables
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def next_jpeg_marker(g, position, end_limit):
+    while position < end_limit:
+        chunk = read_at(g, position, min(SCAN_CHUNK, end_limit - position))
+        if len(chunk) < 2:
+            return -1
+        match = JPEG_MARKER.search(chunk)
+        if match:
+            return position + match.start()
+        position += len(chunk) - 1 #the 0xFF can be the last byte of the chunk
+    return -1
+
+
+def validate_jpeg(g, start, limit):
+    # walks the segments from SOI to EOI, the entropy coded data after each SOS is skipped up to the next real marker
+    # embedded thumbnails live inside APP segments, so their EOI doesn't cut the file anymore
+    # returns the end of the file or 0 if this is not a jpeg
+    window = Window(g)
+    end_limit = start + limit
+    if window.read(start, 2) != b'\xff\xd8':
+        return 0
+    position = start + 2
+    frame = False
+    while position < end_limit:
+        marker = window.read(position, 4)
+        if len(marker) < 2 or marker[0] != 0xff:
+            return 0
+        code = marker[1]
+        if code == 0xff: #fill byte before a marker
+            position += 1
+            continue
+        if code == 0xd9: #EOI
+            return position + 2 if frame else 0
+        if code in JPEG_STANDALONE:
+            position += 2
+            continue
+        if code < 0xc0 or code == 0xd8 or len(marker) < 4:
+            return 0
+        length = int.from_bytes(marker[2:4], 'big')
+        if length < 2:
+            return 0
+        position += 2 + length
+        if code in JPEG_FRAMES:
+            frame = True
+        elif code == 0xda: #SOS, the compressed image follows
+            if not frame:
+                return 0
+            position = next_jpeg_marker(g, position, end_limit)
+            if position == -1:
+                return 0
+    return 0
+
+
+def validate_png(g, start, limit):
+    # follows the chunk chain from IHDR to IEND checking the CRC of every chunk
+    # returns the end of the file or 0 if this is not a png
+    window = Window(g)
+    end_limit = start + limit
+    if window.read(start, 8) != PNG_SIGNATURE:
+        return 0
+    position = start + 8
+    first = True
+    while position < end_limit:
+        header = window.read(position, 8)
+        if len(header) < 8:
+            return 0
+        length = unpack_from('>I', header)[0]
+        chunk_type = header[4:8]
+        if length > 0x7fffffff or not chunk_type.isalpha():
+            return 0
+        if first and (chunk_type != b'IHDR' or length != 13):
+            return 0
+        first = False
+        if position + 12 + length > end_limit:
+            return 0
+
+        crc = zlib.crc32(chunk_type)
+        data_position = position + 8
+        remaining = length
+        while remaining > 0: #big IDAT chunks are read in pieces, the CRC is computed on the way
+            data = window.read(data_position, min(SCAN_CHUNK, remaining))
+            if not data:
+                return 0
+            crc = zlib.crc32(data, crc)
+            data_position += len(data)
+            remaining -= len(data)
+        stored = window.read(data_position, 4)
+        if len(stored) < 4 or unpack_from('>I', stored)[0] != crc:
+            return 0
+        position = data_position + 4
+        if chunk_type == b'IEND':
+            return position
+    return 0
+
+
+def skip_sub_blocks(window, position, end_limit):
+    # GIF data is split in sub-blocks of at most 255 bytes, each one starting with its size, a size 0 ends them
+    while position < end_limit:
+        size = window.read(position, 1)
+        if not size:
+            return -1
+        position += 1 + size[0]
+        if size[0] == 0:
+            return position
+    return -1
+
+
+def validate_gif(g, start, limit):
+    # goes through the extension and image blocks up to the trailer
+    # returns the end of the file or 0 if this is not a gif
+    window = Window(g)
+    end_limit = start + limit
+    header = window.read(start, 13)
+    if len(header) < 13 or header[:6] not in (b'GIF89a', b'GIF87a'):
+        return 0
+    flags = header[10]
+    position = start + 13
+    if flags & 0x80: #global color table
+        position += 3 * (2 << (flags & 0x07))
+    images = 0
+    while 0 <= position < end_limit:
+        block = window.read(position, 1)
+        if not block:
+            return 0
+        if block == b'\x3b': #trailer
+            return position + 1 if images else 0
+        if block == b'\x21': #extension: label and sub-blocks
+            position = skip_sub_blocks(window, position + 2, end_limit)
+        elif block == b'\x2c': #image descriptor
+            descriptor = window.read(position + 1, 9)
+            if len(descriptor) < 9:
+                return 0
+            position += 10
+            if descriptor[8] & 0x80: #local color table
+                position += 3 * (2 << (descriptor[8] & 0x07))
+            code_size = window.read(position, 1)
+            if not code_size or not 1 <= code_size[0] <= 11: #LZW minimum code size
+                return 0
+            position = skip_sub_blocks(window, position + 1, end_limit)
+            images += 1
+        else:
+            return 0
+    return 0
+
+
+VALIDATORS = {
+    'validate_jpeg': validate_jpeg,
+    'validate_png': validate_png,
+    'validate_gif': validate_gif,
+}
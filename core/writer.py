@@ -0,0 +1,94 @@
+import os
+import queue
+import threading
+from extract import copy_range
+from log import Log
+
+WRITER_THREADS = 4
+MAX_QUEUED_BYTES = 256*1024*1024 #the scan waits when this much data is still waiting to be written
+
+
+class Writer:
+    # copies the carved files out of the image in background threads, so a slow evidence drive (USB, NFS...)
+    # doesn't stop the scan on every file; with threads=0 the files are written right away like before
+    def __init__(self, source_fd, threads=WRITER_THREADS, max_queued=MAX_QUEUED_BYTES, fsync=False, dedup=None, catalog=None, log=None):
+        self.source_fd = source_fd
+        self.log = log or Log() #every recovered file goes through here, so does its "Success" line in verbose
+        self.max_queued = max_queued
+        self.fsync = fsync
+        self.dedup = dedup #a Deduplicator (see dedup.py) hashes the files and keeps one copy of each content
+        self.catalog = catalog #a Catalog (see catalog.py) gets every file written, the deduplicator updates it itself
+        self.seq = 0 #order of the files, the deduplication keeps the first one
+        self.queued = 0 #bytes submitted and not written yet
+        self.written = 0
+        self.errors = []
+        self.lock = threading.Condition()
+        self.jobs = queue.Queue()
+        self.threads = [threading.Thread(target=self.work, daemon=True) for _ in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def write(self, offset, length, path):
+        self.log.extracted(os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path)), length)
+        seq = self.seq
+        self.seq += 1
+        if not self.threads:
+            self.copy(seq, offset, length, path)
+            return
+        with self.lock:
+            # backpressure: wait for the writers to catch up, but a file bigger than the limit still goes when the queue is empty
+            while self.queued and self.queued + length > self.max_queued:
+                self.lock.wait()
+            self.queued += length
+        self.jobs.put((seq, offset, length, path))
+
+    def copy(self, seq, offset, length, path):
+        try:
+            if self.dedup is not None:
+                written = self.dedup.copy(self.source_fd, seq, offset, length, path, fsync=self.fsync)
+            else:
+                written = copy_range(self.source_fd, offset, length, path, fsync=self.fsync)
+                if self.catalog is not None:
+                    self.catalog.add(path, offset, length)
+            with self.lock:
+                self.written += written
+        except Exception as e: #not only OSError: a thread that dies leaves the scan waiting on the queue forever
+            self.log.error(f"writing {path}: {e}")
+            with self.lock:
+                self.errors.append((path, e))
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            seq, offset, length, path = job
+            try:
+                self.copy(seq, offset, length, path)
+            finally:
+                with self.lock:
+                    self.queued -= length
+                    self.lock.notify_all()
+
+    def flush(self):
+        # waits until every file submitted so far is written, the threads keep running
+        with self.lock:
+            while self.queued:
+                self.lock.wait()
+        if self.dedup is not None:
+            self.dedup.save()
+        if self.catalog is not None:
+            self.catalog.flush()
+
+    def close(self, finished=True):
+        # waits until every queued file is on the disk. finished=False: the carve stopped before its end (cancelled,
+        # failed), the manifest stays the one of the last checkpoint, a resume carves the files after it again
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.dedup is not None and finished:
+            self.dedup.save()
+        if self.catalog is not None:
+            self.catalog.flush()
@@ -0,0 +1,150 @@
+import zlib
+from struct import unpack_from
+from imageio import read_at, find_at
+
+LOCAL_HEADER = b'PK\x03\x04'
+DATA_DESCRIPTOR = b'PK\x07\x08'
+CENTRAL_HEADER = b'PK\x01\x02'
+ZIP64_END = b'PK\x06\x06'
+ZIP64_LOCATOR = b'PK\x06\x07'
+END_OF_CENTRAL = b'PK\x05\x06'
+
+CONTENT_TYPES_LIMIT = 1024*1024 #[Content_Types].xml is a few KB, we don't inflate more than that
+
+OFFICE_TYPES = [ #content type found in [Content_Types].xml, folder of the main part, extension
+    (b'wordprocessingml', b'word/', 'docx'),
+    (b'spreadsheetml', b'xl/', 'xlsx'),
+    (b'presentationml', b'ppt/', 'pptx'),
+]
+
+
+def zip64_sizes(extra, compressed, uncompressed):
+    # when a size is 0xFFFFFFFF the real one is in the zip64 extra field (id 1): uncompressed first, then compressed
+    position = 0
+    while position + 4 <= len(extra):
+        field_id, field_len = unpack_from('<HH', extra, position)
+        if field_id == 1:
+            values = extra[position + 4 : position + 4 + field_len]
+            index = 0
+            if uncompressed == 0xFFFFFFFF and index + 8 <= len(values):
+                uncompressed = unpack_from('<Q', values, index)[0]
+                index += 8
+            if compressed == 0xFFFFFFFF and index + 8 <= len(values):
+                compressed = unpack_from('<Q', values, index)[0]
+            break
+        position += 4 + field_len
+    return compressed, uncompressed
+
+
+def find_data_end(g, data_start, limit):
+    # for streamed entries (flag bit 3) the sizes are only in the data descriptor after the data,
+    # so we look for a descriptor whose compressed size matches the distance from the start of the data
+    position = data_start
+    while True:
+        position = find_at(g, DATA_DESCRIPTOR, position, limit)
+        if position == -1:
+            return None
+        descriptor = read_at(g, position, 24)
+        if len(descriptor) >= 16 and unpack_from('<I', descriptor, 8)[0] == position - data_start:
+            return position + 16
+        if len(descriptor) >= 24 and unpack_from('<Q', descriptor, 8)[0] == position - data_start:
+            return position + 24 #zip64 descriptor, the sizes are 8 bytes
+        position += 4
+
+
+def classify(names, content_types):
+    for content_type, folder, extension in OFFICE_TYPES:
+        if content_types is not None and content_type in content_types:
+            return extension
+    for content_type, folder, extension in OFFICE_TYPES: #the content types can be compressed with something we can't read
+        if content_types is not None and any(name.startswith(folder) for name in names):
+            return extension
+    return 'zip'
+
+
+def read_content_types(g, data_start, compressed, method):
+    data = read_at(g, data_start, min(compressed, CONTENT_TYPES_LIMIT))
+    if method == 0:
+        return data
+    if method == 8:
+        try:
+            return zlib.decompressobj(-15).decompress(data, CONTENT_TYPES_LIMIT)
+        except zlib.error:
+            return b''
+    return b''
+
+
+def walk_zip(g, start, limit):
+    # walks the local file headers from start up to the end of central directory, reading only the headers
+    # returns (end offset, extension) or None if this is not the beginning of a complete archive
+    end_limit = start + limit
+    position = start
+    names = []
+    content_types = None
+
+    while True:
+        header = read_at(g, position, 30)
+        if header[:4] != LOCAL_HEADER:
+            break
+        if len(header) < 30:
+            return None
+        flags, method = unpack_from('<HH', header, 6)
+        compressed, uncompressed = unpack_from('<II', header, 18)
+        name_len, extra_len = unpack_from('<HH', header, 26)
+        name = read_at(g, position + 30, name_len)
+        data_start = position + 30 + name_len + extra_len
+        if compressed == 0xFFFFFFFF or uncompressed == 0xFFFFFFFF:
+            compressed, uncompressed = zip64_sizes(read_at(g, position + 30 + name_len, extra_len), compressed, uncompressed)
+
+        if flags & 0x08 and compressed == 0: #streamed entry, the size is only known after the data
+            position = find_data_end(g, data_start, end_limit)
+            if position is None:
+                return None
+        else:
+            position = data_start + compressed
+            if flags & 0x08: #the descriptor is there even if the sizes were known, with or without its signature
+                position += 16 if read_at(g, position, 4) == DATA_DESCRIPTOR else 12
+
+        if name == b'[Content_Types].xml':
+            content_types = read_content_types(g, data_start, compressed, method)
+        names.append(name)
+        if position > end_limit:
+            return None
+
+    if not names:
+        return None
+
+    central_start = position
+    entries = 0
+    while read_at(g, position, 4) == CENTRAL_HEADER:
+        header = read_at(g, position, 46)
+        if len(header) < 46:
+            return None
+        name_len, extra_len, comment_len = unpack_from('<HHH', header, 28)
+        position += 46 + name_len + extra_len + comment_len
+        entries += 1
+        if position > end_limit:
+            return None
+
+    central_end = position
+    if read_at(g, position, 4) == ZIP64_END:
+        record = read_at(g, position, 12)
+        if len(record) < 12:
+            return None
+        position += 12 + unpack_from('<Q', record, 4)[0]
+    if read_at(g, position, 4) == ZIP64_LOCATOR:
+        position += 20
+
+    end = read_at(g, position, 22)
+    if len(end) < 22 or end[:4] != END_OF_CENTRAL:
+        return None
+    total_entries, central_size, central_offset, comment_len = unpack_from('<HIIH', end, 10)
+    # the central directory has to describe the entries we just walked, otherwise it belongs to another archive
+    if total_entries != 0xFFFF and total_entries != entries:
+        return None
+    if central_offset != 0xFFFFFFFF and central_offset != central_start - start:
+        return None
+    if central_size != 0xFFFFFFFF and central_size != central_end - central_start:
+        return None
+
+    return position + 22 + comment_len, classify(names, content_types)
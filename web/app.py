@@ -1,8 +1,11 @@
 import os
 import sys
 import json
-import threading
-from flask import Flask, request, jsonify, send_file
+import time
+import heapq
+import hashlib
+import itertools
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from pathlib import Path
 from werkzeug.utils import secure_filename
@@ -13,7 +16,15 @@ from rich.table import Table
 from rich.progress import Progress
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
-from lawliet import carve
+from lawliet import carve, extract_hits
+from signatures import SIGNATURES
+from strategies import select, output_format
+from checkpoint import load_checkpoint
+from hitindex import HitIndex, index_path, image_size
+from catalog import Catalog, CATALOG_NAME, SORTS
+from jobs import Job, JobManager, Failed
+from uploads import Uploads, UploadError
+from containers import SPLIT, RAW, image_kind, split_segments
 
 app = Flask(__name__, static_folder='.')
 CORS(app)
@@ -23,18 +34,40 @@ console = Console()
 PROJECT_ROOT = Path(__file__).parent.parent
 STORAGE_DIR = PROJECT_ROOT / 'storage'
 RECOVERED_DIR = PROJECT_ROOT / 'recovered'
+INDEX_DIR = PROJECT_ROOT / 'index'
 WEB_DIR = Path(__file__).parent
 
+LEGACY_JOB = 'legacy' #the job the files recovered before the jobs had their own directory are listed in
+
 STORAGE_DIR.mkdir(exist_ok=True)
 RECOVERED_DIR.mkdir(exist_ok=True)
+INDEX_DIR.mkdir(exist_ok=True)
+
+def migrate_recovered():
+    # once, at startup: the format folders a recovery used to write straight in RECOVERED_DIR (recovered/jpeg/...) go
+    # in RECOVERED_DIR/legacy, and the directories from before the catalogs get theirs, filled from their files
+    legacy = RECOVERED_DIR / LEGACY_JOB
+    for folder in sorted(RECOVERED_DIR.iterdir()):
+        if folder.is_dir() and folder.name in SIGNATURES and not (legacy / folder.name).exists():
+            legacy.mkdir(exist_ok=True)
+            os.replace(folder, legacy / folder.name)
+    for job_dir in sorted(RECOVERED_DIR.iterdir()):
+        if job_dir.is_dir() and not (job_dir / CATALOG_NAME).exists() and any((job_dir / format).is_dir() for format in SIGNATURES):
+            Catalog.open(str(job_dir)).close()
+
+migrate_recovered()
 
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024 * 1024  
-ALLOWED_EXTENSIONS = {'raw', 'img', 'dd', 'bin'}
+ALLOWED_EXTENSIONS = {'raw', 'img', 'dd', 'bin', 'gz', 'bgz', 'gzi', 'zst', 'zstd'} #and the segments of a split image, .001...
+FILES_PAGE = 200 #files in a page of /api/files
+MAX_FILES_PAGE = 5000
 
 operations = {
-    'file_recovery': {'status': 'idle', 'progress': 0, 'message': ''},
     'file_upload': {'status': 'idle', 'progress': 0, 'message': '', 'filename': ''}
 }
+jobs = JobManager(RECOVERED_DIR) #the recoveries, each one writes in RECOVERED_DIR/<job id>
+uploads = Uploads(STORAGE_DIR / '.uploads') #the chunked uploads in progress, on the same filesystem as the images
+HASHES_SUFFIX = '.hashes.json' #next to an uploaded image, its sha-256 and md5 computed during the upload
 
 ASCII_ART = """
  [bold red]██╗      █████╗ ██╗    ██╗██╗     ██╗███████╗████████╗[/bold red]
@@ -55,7 +88,7 @@ def print_welcome():
 
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return '.' in filename and (filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS or SPLIT.match(filename) is not None)
 
 @app.route('/')
 def index():
@@ -124,12 +157,136 @@ def upload_image():
         operations['file_upload']['message'] = str(e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def upload_progress(upload):
+    operations['file_upload']['status'] = 'uploading'
+    operations['file_upload']['progress'] = int(upload.received * 100 / upload.size) if upload.size else 100
+    operations['file_upload']['message'] = f'Uploading {upload.filename}: {format_bytes(upload.received)} of {format_bytes(upload.size)}'
+    operations['file_upload']['filename'] = upload.filename
+
+@app.route('/api/uploads', methods=['POST'])
+def start_upload():
+    # a chunked upload: {"filename", "size"} gives an upload id, then PUT /api/uploads/<id>?offset=N with the bytes
+    # of each chunk in the body and POST /api/uploads/<id>/finalize. Starting it again with its "upload_id" (or the
+    # "sha256" it was started with) gives the upload in progress, with the offset it goes on from
+    data = request.json or {}
+    filename = secure_filename(data.get('filename') or '')
+    size = data.get('size')
+    sha256 = data.get('sha256')
+    
+    if not filename:
+        return jsonify({'success': False, 'error': 'No file selected'}), 400
+    
+    if not allowed_file(filename):
+        return jsonify({'success': False, 'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
+    
+    if not isinstance(size, int) or size < 0 or size > app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({'success': False, 'error': 'Invalid size'}), 400
+    
+    if sha256 is not None and (not isinstance(sha256, str) or len(sha256) != 64 or any(c not in '0123456789abcdefABCDEF' for c in sha256)):
+        return jsonify({'success': False, 'error': 'Invalid sha256'}), 400
+    
+    if (STORAGE_DIR / filename).exists():
+        return jsonify({'success': False, 'error': f'File {filename} already exists'}), 409
+    
+    try:
+        upload = uploads.create(filename, size, data.get('upload_id'), sha256)
+    except UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    
+    upload_progress(upload)
+    return jsonify({'success': True, 'upload': upload.to_dict()})
+
+@app.route('/api/uploads', methods=['GET'])
+def list_uploads():
+    return jsonify({'success': True, 'uploads': [upload.to_dict() for upload in uploads.list()]})
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    upload = uploads.get(upload_id)
+    if upload is None:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    return jsonify({'success': True, 'upload': upload.to_dict()})
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def append_upload(upload_id):
+    # the body goes to the image at ?offset=, which must be where the upload is (its "received"), a 409 says where
+    upload = uploads.get(upload_id)
+    if upload is None:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'success': False, 'error': 'offset is required'}), 400
+    
+    try:
+        upload.append(offset, request.stream, upload_progress)
+    except UploadError as e:
+        return jsonify({'success': False, 'error': str(e), 'upload': upload.to_dict()}), e.status
+    
+    return jsonify({'success': True, 'upload': upload.to_dict()})
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    # the image goes in the storage with the hashes computed during the upload, {"sha256", "md5"} (optional) are
+    # checked against them
+    upload = uploads.get(upload_id)
+    if upload is None:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    
+    data = request.json or {}
+    filepath = STORAGE_DIR / upload.filename
+    try:
+        hashes = upload.finalize(str(filepath), data.get('sha256'), data.get('md5'))
+    except UploadError as e:
+        return jsonify({'success': False, 'error': str(e), 'upload': upload.to_dict()}), e.status
+    uploads.remove(upload_id)
+    
+    with open(str(filepath) + HASHES_SUFFIX, 'w') as f:
+        json.dump(hashes, f)
+    
+    operations['file_upload']['status'] = 'completed'
+    operations['file_upload']['progress'] = 100
+    operations['file_upload']['message'] = f'Upload completed: {upload.filename}'
+    
+    return jsonify({
+        'success': True,
+        'message': 'File uploaded successfully',
+        'filename': upload.filename,
+        'size': upload.size,
+        **hashes
+    })
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    upload = uploads.remove(upload_id)
+    if upload is None:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    upload.abort()
+    return jsonify({'success': True, 'message': f'Upload of {upload.filename} aborted'})
+
+def recovery_job(source_path, options, job_id=None):
+    # a recovery of source_path, a job put back in the queue (or rebuilt after a restart) goes on from its last checkpoint
+    def run(job):
+        finished = carve(str(source_path), str(job.output), options['buffer_size'], use_mmap=options['use_mmap'], workers=options['workers'],
+                         fsync=options['fsync'], resume=job.resumed, index_dir=str(INDEX_DIR), dedup=options.get('dedup'), unallocated=options.get('unallocated', False),
+                         formats=options.get('formats'), progress=job.carve_progress)
+        if not finished:
+            raise Failed(job.carve_progress.log.last_error or 'The recovery stopped on an error')
+    
+    return Job('recover', run, workers=options['workers'], params={'image': str(source_path), **options}, job_id=job_id)
+
 @app.route('/api/recover', methods=['POST'])
 def recover_files():
     data = request.json
     image_path = data.get('image_path')
     device_path = data.get('device_path')
     buffer_size_mb = data.get('buffer_size', 8)
+    use_mmap = bool(data.get('mmap', False))
+    workers = data.get('workers', 1)
+    fsync = bool(data.get('fsync', False))
+    dedup = data.get('dedup') #None, 'link' or 'skip'
+    unallocated = bool(data.get('unallocated', False)) #only the free clusters of the filesystems of the image
+    formats = data.get('formats') #a list (or a comma separated string) of formats to carve, all of them if None
     
     # Must provide either image_path or device_path
     if not image_path and not device_path:
@@ -145,6 +302,24 @@ def recover_files():
     except (ValueError, TypeError):
         return jsonify({'success': False, 'error': 'Invalid buffer size'}), 400
     
+    try:
+        workers = int(workers)
+        if workers < 1 or workers > (os.cpu_count() or 1):
+            return jsonify({'success': False, 'error': f'Workers must be between 1 and {os.cpu_count() or 1}'}), 400
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'error': 'Invalid number of workers'}), 400
+    
+    if dedup not in (None, 'link', 'skip'):
+        return jsonify({'success': False, 'error': "Dedup must be 'link' or 'skip'"}), 400
+    
+    if isinstance(formats, str):
+        formats = [format.strip() for format in formats.split(',') if format.strip()]
+    if formats is not None:
+        try:
+            formats = [format for format in select(formats) if format in formats] #the family of a format is scanned, not written
+        except (ValueError, TypeError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    
     buffer_size_bytes = buffer_size_mb * 1024 * 1024
     
     # Handle device paths (like /dev/sdb)
@@ -174,30 +349,152 @@ def recover_files():
         if not source_path.exists():
             return jsonify({'success': False, 'error': f'Image file not found: {source_path}'}), 404
     
-    if operations['file_recovery']['status'] == 'running':
-        return jsonify({'success': False, 'error': 'File recovery already in progress'}), 409
+    job = jobs.submit(recovery_job(source_path, {'buffer_size': buffer_size_bytes, 'use_mmap': use_mmap, 'workers': workers, 'fsync': fsync, 'dedup': dedup, 'unallocated': unallocated, 'formats': formats}))
     
-    def run_recovery():
-        operations['file_recovery']['status'] = 'running'
-        operations['file_recovery']['progress'] = 0
-        operations['file_recovery']['message'] = f'Starting file recovery with {buffer_size_mb}MB buffer...'
-        
-        try:
-            carve(str(source_path), str(RECOVERED_DIR), buffer_size_bytes)
-            
-            operations['file_recovery']['status'] = 'completed'
-            operations['file_recovery']['progress'] = 100
-            operations['file_recovery']['message'] = 'File recovery completed successfully'
-        
-        except Exception as e:
-            operations['file_recovery']['status'] = 'error'
-            operations['file_recovery']['message'] = str(e)
+    return jsonify({'success': True, 'message': 'File recovery queued', 'job_id': job.id})
+
+@app.route('/api/recover/resume', methods=['POST'])
+def resume_recovery():
+    # puts back in the queue a recovery that was cancelled, failed or died with the server, it goes on from its checkpoint
+    job_id = (request.json or {}).get('job_id')
+    if not job_id:
+        return jsonify({'success': False, 'error': 'job_id is required'}), 400
+    
+    job = jobs.get(job_id)
+    if job is not None and job.status in ('queued', 'running'):
+        return jsonify({'success': False, 'error': 'This job is still running'}), 409
+    
+    state = load_checkpoint(RECOVERED_DIR / secure_filename(job_id))
+    if state is None:
+        return jsonify({'success': False, 'error': 'No interrupted recovery to resume'}), 404
     
-    thread = threading.Thread(target=run_recovery)
-    thread.daemon = True
-    thread.start()
+    if not os.path.exists(state['image']):
+        return jsonify({'success': False, 'error': f"Image file not found: {state['image']}"}), 404
     
-    return jsonify({'success': True, 'message': 'File recovery started'})
+    if job is None: #the server restarted since, the checkpoint has everything needed to rebuild the job
+        job = recovery_job(state['image'], state['options'], job_id=secure_filename(job_id))
+    jobs.resume(job)
+    
+    return jsonify({'success': True, 'message': 'File recovery resumed', 'job_id': job.id, 'position': state['position'], 'size': state['size'], 'recovered': state['i']})
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify({'success': True, 'jobs': [job.to_dict() for job in jobs.list()]})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+def event_stream(state, running):
+    # server-sent events: state() every half second, as long as its status is one of running
+    def events():
+        while True:
+            current = state()
+            yield f"data: {json.dumps(current)}\n\n"
+            if current['status'] not in running:
+                return
+            time.sleep(0.5)
+    
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    # server-sent events: the state of the job every half second until it is finished
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return event_stream(job.to_dict, ('queued', 'running'))
+
+def open_hit_index(image_path, device_path, unallocated=False):
+    # returns (source path, index) for the image or device of a request, or (None, error response)
+    # unallocated: the index of the recoveries of the unallocated space only
+    if device_path:
+        source_path = Path(device_path)
+    elif image_path:
+        source_path = Path(image_path) if os.path.isabs(image_path) else STORAGE_DIR / image_path
+    else:
+        return None, (jsonify({'success': False, 'error': 'Either image_path or device_path is required'}), 400)
+    
+    if not source_path.exists():
+        return None, (jsonify({'success': False, 'error': f'Image file not found: {source_path}'}), 404)
+    
+    try:
+        path = index_path(str(source_path), image_size(str(source_path)), str(INDEX_DIR), unallocated)
+    except OSError as e:
+        return None, (jsonify({'success': False, 'error': f'Error reading the image: {e}'}), 500)
+    
+    if not os.path.exists(path):
+        return None, (jsonify({'success': False, 'error': 'This image has no hit index yet, run a recovery first'}), 404)
+    
+    return source_path, HitIndex(path)
+
+@app.route('/api/hits', methods=['GET'])
+def list_hits():
+    # every signature hit found in an image by a previous recovery, straight from its index
+    unallocated = request.args.get('unallocated', '').lower() in ('1', 'true')
+    source_path, index = open_hit_index(request.args.get('image_path'), request.args.get('device_path'), unallocated)
+    if source_path is None:
+        return index
+    
+    try:
+        formats = request.args.get('format')
+        hits = index.hits(
+            formats=formats.split(',') if formats else None,
+            recovered_as=output_format, #a docx found by the zip header is an office_new file
+            status=request.args.get('status'),
+            start=request.args.get('start', type=int),
+            end=request.args.get('end', type=int),
+            limit=request.args.get('limit', 1000, type=int),
+            skip=request.args.get('skip', 0, type=int),
+        )
+        return jsonify({'success': True, 'complete': index.complete, 'hits': hits})
+    
+    finally:
+        index.close()
+
+@app.route('/api/hits/extract', methods=['POST'])
+def extract_indexed_files():
+    # extracts the selected files of an image from its index into the recovered directory, without scanning the image
+    data = request.json
+    source_path, index = open_hit_index(data.get('image_path'), data.get('device_path'), bool(data.get('unallocated', False)))
+    if source_path is None:
+        return index
+    
+    try:
+        hits = index.hits(formats=data.get('formats'), status='carved', recovered_as=output_format)
+    finally:
+        index.close()
+    
+    dedup = data.get('dedup')
+    if dedup not in (None, 'link', 'skip'):
+        return jsonify({'success': False, 'error': "Dedup must be 'link' or 'skip'"}), 400
+    
+    offsets = data.get('offsets')
+    if offsets is not None:
+        offsets = set(offsets)
+        hits = [hit for hit in hits if hit['offset'] in offsets]
+    
+    def run(job):
+        job.carve_progress.start(sum(hit['length'] for hit in hits), phase="extracting")
+        extract_hits(str(source_path), str(job.output), hits, dedup=dedup, progress=job.carve_progress)
+        job.carve_progress.finish()
+    
+    job = jobs.submit(Job('extract', run, params={'image': str(source_path), 'files': len(hits), 'dedup': dedup}))
+    
+    return jsonify({'success': True, 'message': 'Extraction queued', 'files': len(hits), 'job_id': job.id})
 
 @app.route('/api/progress/<operation>', methods=['GET'])
 def get_progress(operation):
@@ -206,6 +503,14 @@ def get_progress(operation):
     
     return jsonify({'success': True, 'operation': operations[operation]})
 
+@app.route('/api/progress/<operation>/stream', methods=['GET'])
+def stream_progress(operation):
+    # server-sent events: the state of the operation every half second until it is not running anymore
+    if operation not in operations:
+        return jsonify({'success': False, 'error': 'Invalid operation'}), 400
+    
+    return event_stream(lambda: dict(operations[operation]), ('running',))
+
 @app.route('/api/devices', methods=['GET'])
 def list_devices():
     try:
@@ -249,46 +554,147 @@ def list_images():
     try:
         images = []
         for file in STORAGE_DIR.glob('*'):
-            if file.is_file() and file.suffix.lower() in ['.raw', '.img', '.dd', '.bin']:
-                stat = file.stat()
-                images.append({
-                    'name': file.name,
-                    'path': str(file),
-                    'size': stat.st_size,
-                    'size_human': format_bytes(stat.st_size),
-                    'modified': stat.st_mtime
-                })
+            if not file.is_file():
+                continue
+            kind = image_kind(str(file))
+            split = SPLIT.match(file.name)
+            if split and (int(split.group(2)) > 1 or (int(split.group(2)) == 1 and (STORAGE_DIR / f"{split.group(1)}.000").exists())):
+                continue #listed with the first segment
+            if kind == RAW and not split and file.suffix.lower() not in ['.raw', '.img', '.dd', '.bin']:
+                continue
+            stat = file.stat()
+            segments = split_segments(str(file))
+            size = sum(os.path.getsize(segment) for segment in segments) #of the compressed file for bgzf and zstd
+            image = {
+                'name': file.name,
+                'path': str(file),
+                'size': size,
+                'size_human': format_bytes(size),
+                'modified': stat.st_mtime,
+                'format': kind,
+                'segments': len(segments)
+            }
+            hashes = Path(str(file) + HASHES_SUFFIX)
+            if hashes.exists() and hashes.stat().st_mtime >= stat.st_mtime: #computed during the upload of this file
+                image.update(json.loads(hashes.read_text()))
+            images.append(image)
         
         return jsonify({'success': True, 'images': images})
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def open_catalogs(job_id=None, source=None):
+    # (job id, catalog) of every job directory, of one job or of the recoveries of one image (its name or path),
+    # opened read-only: a GET never writes in the recovered directory
+    if job_id:
+        job_dirs = [RECOVERED_DIR / secure_filename(job_id)]
+    else:
+        job_dirs = sorted(job_dir for job_dir in RECOVERED_DIR.iterdir() if job_dir.is_dir())
+    
+    catalogs = []
+    for job_dir in job_dirs:
+        catalog = Catalog.read(str(job_dir)) if job_dir.is_dir() else None
+        if catalog is None: #not a job directory, or a job that didn't start writing yet
+            continue
+        image = catalog.image
+        if source and (image is None or source not in (image, os.path.basename(image))):
+            catalog.close()
+            continue
+        catalogs.append((job_dir.name, catalog))
+    return catalogs
+
+def parse_cursor(cursor):
+    # "job:id,job:id", the last change of each catalog a client has
+    since = {}
+    for part in filter(None, cursor.split(',')):
+        job, _, last = part.rpartition(':')
+        since[job] = int(last)
+    return since
+
+def format_cursor(cursor):
+    return ','.join(f"{job}:{last}" for job, last in sorted(cursor.items()))
+
 @app.route('/api/files', methods=['GET'])
 def list_recovered_files():
+    # the recovered files, from the catalogs the carves write as they go (see core/catalog.py), one page at a time:
+    # ?type=jpeg,pdf&extension=&min_size=&max_size=&source=&job_id=&sort=id|offset|size|type|path&order=asc|desc&limit=&skip=
+    # With ?since=<cursor of an earlier answer> only what changed after it comes, in order, removed files included.
+    # The ETag only changes with the catalogs, If-None-Match gets a 304 while nothing was recovered
+    args = request.args
+    try:
+        filters = {
+            'types': args['type'].split(',') if args.get('type') else None,
+            'extensions': args['extension'].split(',') if args.get('extension') else None,
+            'min_size': args.get('min_size', type=int),
+            'max_size': args.get('max_size', type=int),
+        }
+        limit = max(0, min(args.get('limit', FILES_PAGE, type=int), MAX_FILES_PAGE))
+        skip = max(0, args.get('skip', 0, type=int))
+        since = parse_cursor(args['since']) if 'since' in args else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid since cursor'}), 400
+    sort = args.get('sort', 'id')
+    if sort not in SORTS:
+        return jsonify({'success': False, 'error': f'Sort must be one of {", ".join(SORTS)}'}), 400
+    descending = args.get('order') == 'desc'
+    
+    catalogs = open_catalogs(args.get('job_id'), args.get('source'))
     try:
-        files_by_type = {}
+        # read before the query: a file recovered meanwhile may come in this answer and again after the cursor
+        last = {job: catalog.last_id for job, catalog in catalogs}
+        etag = hashlib.sha256(f"{request.query_string!r}:{format_cursor(last)}".encode()).hexdigest()[:32]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
         
-        for subdir in RECOVERED_DIR.iterdir():
-            if subdir.is_dir():
-                file_type = subdir.name
-                files_by_type[file_type] = []
-                
-                for file in subdir.glob('*'):
-                    if file.is_file():
-                        stat = file.stat()
-                        files_by_type[file_type].append({
-                            'name': file.name,
-                            'path': str(file.relative_to(RECOVERED_DIR)),
-                            'size': stat.st_size,
-                            'size_human': format_bytes(stat.st_size),
-                            'type': file_type
-                        })
+        def listed(job, image, file):
+            return dict(file,
+                        name=os.path.basename(file['path']),
+                        path=f"{job}/{file['path']}",
+                        size_human=format_bytes(file['size']) if file['size'] is not None else None,
+                        removed=bool(file['removed']),
+                        job=job,
+                        source=os.path.basename(image) if image else None)
         
-        return jsonify({'success': True, 'files': files_by_type})
+        if since is not None:
+            files = []
+            cursor = {job: since.get(job, 0) for job, _ in catalogs}
+            more = False
+            for job, catalog in catalogs:
+                changes = catalog.changes(cursor[job], limit - len(files) + 1, **filters)
+                if len(files) + len(changes) > limit:
+                    more = True
+                    changes = changes[:limit - len(files)]
+                image = catalog.image
+                files += [listed(job, image, file) for file in changes]
+                if more:
+                    if changes:
+                        cursor[job] = changes[-1]['id']
+                    break
+                cursor[job] = max([last[job]] + [file['id'] for file in changes[-1:]])
+            response = jsonify({'success': True, 'files': files, 'more': more, 'cursor': format_cursor(cursor)})
+        else:
+            # every catalog gives its first skip + limit files in order, merged across the jobs
+            pages = []
+            for job, catalog in catalogs:
+                image = catalog.image
+                rows = catalog.files(sort, descending, skip + limit, **filters)
+                pages.append([(-1 if row[sort] is None else row[sort], job, row['id'], image, row) for row in rows])
+            merged = heapq.merge(*pages, key=lambda entry: entry[:3], reverse=descending)
+            files = [listed(job, image, row) for _, job, _, image, row in itertools.islice(merged, skip, skip + limit)]
+            total = sum(catalog.count(**filters) for _, catalog in catalogs)
+            response = jsonify({'success': True, 'files': files, 'total': total, 'skip': skip, 'limit': limit, 'cursor': format_cursor(last)})
+        response.set_etag(etag)
+        return response
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
+    
+    finally:
+        for _, catalog in catalogs:
+            catalog.close()
 
 @app.route('/api/download/<path:filepath>', methods=['GET'])
 def download_file(filepath):
@@ -318,7 +724,11 @@ def delete_image(filename):
         if not str(filepath.resolve()).startswith(str(STORAGE_DIR.resolve())):
             return jsonify({'success': False, 'error': 'Invalid file path'}), 403
         
-        filepath.unlink()
+        for segment in split_segments(str(filepath)): #all of a split image
+            Path(segment).unlink()
+            for sidecar in (Path(segment + HASHES_SUFFIX), Path(segment + '.gzi')):
+                if sidecar.exists():
+                    sidecar.unlink()
         return jsonify({'success': True, 'message': f'Deleted {filename}'})
     
     except Exception as e:
@@ -1,7 +1,14 @@
 const API_BASE = 'http://localhost:5000/api';
 
-let allFiles = [];
-let filteredFiles = [];
+const PAGE_SIZE = 200;
+const POLL_INTERVAL = 3000;
+
+// the files shown, by path, in the order the server lists them (the order they were recovered)
+let shownFiles = new Map();
+let cursor = null; // the catalogs up to here are shown, the polls ask for what changed after it
+let filteredTotal = 0;
+let allLoaded = false;
+let loadingPage = false;
 let currentTypeFilter = 'all';
 let currentSourceFilter = 'all';
 
@@ -21,45 +28,105 @@ filterTypeButtons.forEach(btn => {
         filterTypeButtons.forEach(b => b.classList.remove('active'));
         btn.classList.add('active');
         currentTypeFilter = btn.dataset.type;
-        applyFilters();
+        loadFiles();
     });
 });
 
 filterSourceSelect.addEventListener('change', () => {
     currentSourceFilter = filterSourceSelect.value;
-    applyFilters();
+    loadFiles();
+});
+
+// the next page comes when the end of the list gets close
+window.addEventListener('scroll', () => {
+    if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 800) {
+        loadPage();
+    }
 });
 
 // Initialize
 loadFiles();
 loadSources();
+setInterval(pollChanges, POLL_INTERVAL);
 
 // Functions
+function filesUrl(params) {
+    const query = new URLSearchParams(params);
+    if (currentTypeFilter !== 'all') query.set('type', currentTypeFilter);
+    if (currentSourceFilter !== 'all') query.set('source', currentSourceFilter);
+    return `${API_BASE}/files?${query}`;
+}
+
+async function fetchFiles(url) {
+    // no-cache: the browser sends the ETag back and gets a 304 while nothing changed
+    const response = await fetch(url, { cache: 'no-cache' });
+    const data = await response.json();
+    if (!data.success) {
+        throw new Error(data.error);
+    }
+    return data;
+}
+
 async function loadFiles() {
+    shownFiles = new Map();
+    cursor = null;
+    allLoaded = false;
+    filesList.innerHTML = '';
     try {
-        const response = await fetch(`${API_BASE}/files`);
-        const data = await response.json();
+        const all = await fetchFiles(`${API_BASE}/files?limit=0`);
+        totalFilesSpan.textContent = all.total;
+    } catch (error) {
+        showToast(`Failed to load files: ${error.message}`, 'error');
+    }
+    await loadPage();
+}
 
-        if (data.success) {
-            allFiles = [];
-
-            // Flatten files with metadata
-            Object.keys(data.files).forEach(type => {
-                data.files[type].forEach(file => {
-                    allFiles.push({
-                        ...file,
-                        format: type
-                    });
-                });
-            });
+async function loadPage() {
+    if (allLoaded || loadingPage) return;
+    loadingPage = true;
+    try {
+        const data = await fetchFiles(filesUrl({ limit: PAGE_SIZE, skip: shownFiles.size }));
+        if (cursor === null) cursor = data.cursor;
+        filteredTotal = data.total;
+        allLoaded = shownFiles.size + data.files.length >= data.total;
+        data.files.forEach(showFile);
+        updateCounts();
+    } catch (error) {
+        showToast(`Failed to load files: ${error.message}`, 'error');
+    } finally {
+        loadingPage = false;
+    }
+}
 
-            totalFilesSpan.textContent = allFiles.length;
-            applyFilters();
-        } else {
-            showToast(`Error loading files: ${data.error}`, 'error');
+async function pollChanges() {
+    // only the files recovered (or removed) since the last answer, not the whole list again
+    if (cursor === null || loadingPage) return;
+    try {
+        let more = true;
+        while (more) {
+            const data = await fetchFiles(filesUrl({ since: cursor, limit: 1000 }));
+            data.files.forEach(file => {
+                if (file.removed) {
+                    if (shownFiles.has(file.path)) {
+                        shownFiles.get(file.path).card.remove();
+                        shownFiles.delete(file.path);
+                        filteredTotal--;
+                    }
+                } else if (shownFiles.has(file.path)) {
+                    const card = createCard(file); // written again by a resumed recovery
+                    shownFiles.get(file.path).card.replaceWith(card);
+                    shownFiles.set(file.path, { file, card });
+                } else {
+                    filteredTotal++;
+                    if (allLoaded) showFile(file); // otherwise it comes with its page
+                }
+            });
+            cursor = data.cursor;
+            more = data.more;
         }
+        updateCounts();
     } catch (error) {
-        showToast(`Failed to load files: ${error.message}`, 'error');
+        console.error('Failed to poll files:', error);
     }
 }
 
@@ -83,49 +150,44 @@ async function loadSources() {
     }
 }
 
-function applyFilters() {
-    filteredFiles = allFiles.filter(file => {
-        const typeMatch = currentTypeFilter === 'all' || file.format === currentTypeFilter;
-        const sourceMatch = currentSourceFilter === 'all' || file.source === currentSourceFilter;
-        return typeMatch && sourceMatch;
-    });
-
-    filteredFilesSpan.textContent = filteredFiles.length;
-    displayFiles(filteredFiles);
-}
-
-function displayFiles(files) {
-    if (files.length === 0) {
+function updateCounts() {
+    filteredFilesSpan.textContent = filteredTotal;
+    if (shownFiles.size === 0) {
         filesList.innerHTML = '<p class="empty-msg">No files match the current filters.</p>';
-        return;
     }
+}
 
-    filesList.innerHTML = '';
+function showFile(file) {
+    if (shownFiles.size === 0) {
+        filesList.innerHTML = '';
+    }
+    const card = createCard(file);
+    shownFiles.set(file.path, { file, card });
+    filesList.appendChild(card);
+}
 
-    files.forEach(file => {
-        const fileCard = document.createElement('div');
-        fileCard.className = 'file-card';
-
-        // Create thumbnail
-        const isImage = ['jpeg', 'jpg', 'png', 'gif'].includes(file.format.toLowerCase());
-        const thumbnailHTML = isImage
-            ? `<div class="file-thumbnail">
-                   <img src="${API_BASE}/download/${file.path}" alt="${file.name}" loading="lazy">
-               </div>`
-            : `<div class="file-thumbnail">
-                   <div class="file-thumbnail-placeholder">${getFileIcon(file.format)}</div>
-               </div>`;
-
-        fileCard.innerHTML = `
-            ${thumbnailHTML}
-            <div class="file-name">${file.name}</div>
-            <div class="file-meta">${file.format.toUpperCase()} • ${file.size_human}</div>
-        `;
-
-        fileCard.addEventListener('click', () => downloadFile(file.path));
-
-        filesList.appendChild(fileCard);
-    });
+function createCard(file) {
+    const fileCard = document.createElement('div');
+    fileCard.className = 'file-card';
+
+    // Create thumbnail
+    const isImage = ['jpeg', 'jpg', 'png', 'gif'].includes(file.type.toLowerCase());
+    const thumbnailHTML = isImage
+        ? `<div class="file-thumbnail">
+               <img src="${API_BASE}/download/${file.path}" alt="${file.name}" loading="lazy">
+           </div>`
+        : `<div class="file-thumbnail">
+               <div class="file-thumbnail-placeholder">${getFileIcon(file.type)}</div>
+           </div>`;
+
+    fileCard.innerHTML = `
+        ${thumbnailHTML}
+        <div class="file-name">${file.name}</div>
+        <div class="file-meta">${file.type.toUpperCase()} • ${file.size_human}</div>
+    `;
+
+    fileCard.addEventListener('click', () => downloadFile(file.path));
+    return fileCard;
 }
 
 function getFileIcon(type) {
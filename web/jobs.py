@@ -0,0 +1,143 @@
+import os
+import time
+import uuid
+import threading
+from progress import CarveProgress, Cancelled
+
+MAX_JOBS = 2 #jobs reading disks at the same time, more would only make the disks seek between them
+CPU_BUDGET = os.cpu_count() or 1 #scanning processes (the workers of each job) running at the same time
+
+
+class Failed(Exception): #raised by the run of a job when the carve stopped on an error it logged
+    pass
+
+
+class Job:
+    # one recovery (or extraction from a hit index) with its own output directory;
+    # run(job) does the work with job.output and job.carve_progress, job.resumed says if it was put back in the queue
+    def __init__(self, kind, run, workers=1, params=None, job_id=None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.run = run
+        self.output = None #set by the JobManager
+        self.resumed = False
+        self.workers = workers
+        self.params = params or {}
+        self.status = 'queued'
+        self.progress = 0
+        self.message = 'Waiting for a free slot...'
+        self.stats = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.carve_progress = CarveProgress(callback=self.update)
+
+    def update(self, stats):
+        self.stats = stats
+        self.progress = int(stats['percent'])
+        files = sum(counts.get('carved', 0) for counts in stats['hits'].values())
+        eta = f", ETA {int(stats['eta'])}s" if stats['eta'] is not None else ''
+        self.message = f"{stats['phase'].capitalize()}: {stats['percent']}% at {stats['mb_per_s']} MB/s{eta}, {files} files recovered"
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'stats': self.stats,
+            'params': self.params,
+            'output': str(self.output),
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class JobManager:
+    # runs the jobs in the order they came, at most max_jobs at a time and never more scanning processes than
+    # cpu_budget (a job alone always runs, even if it asks for more workers than the budget)
+    def __init__(self, root, max_jobs=MAX_JOBS, cpu_budget=CPU_BUDGET):
+        self.root = root #every job writes in root/<job id>, so two jobs never share restored_i names
+        self.max_jobs = max_jobs
+        self.cpu_budget = cpu_budget
+        self.jobs = {} #id -> Job, in submission order
+        self.queue = []
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        job.output = self.root / job.id
+        with self.lock:
+            self.jobs[job.id] = job
+            self.queue.append(job)
+            self.schedule()
+        return job
+
+    def resume(self, job):
+        # puts a finished (cancelled, failed) job back in the queue, its run() decides how to continue
+        job.output = self.root / job.id
+        with self.lock:
+            job.resumed = True
+            job.status = 'queued'
+            job.message = 'Waiting for a free slot...'
+            job.finished = None
+            job.carve_progress = CarveProgress(callback=job.update)
+            self.jobs[job.id] = job
+            self.queue.append(job)
+            self.schedule()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        return list(self.jobs.values())
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == 'queued':
+                self.queue.remove(job)
+                job.status = 'cancelled'
+                job.message = 'Cancelled before it started'
+                job.finished = time.time()
+            elif job.status == 'running':
+                job.carve_progress.cancel() #the carve stops between two buffers
+                job.message = 'Cancelling...'
+        return job
+
+    def schedule(self):
+        # called with the lock held, starts the jobs at the head of the queue while there is room for them
+        while self.queue:
+            job = self.queue[0]
+            running = [other for other in self.jobs.values() if other.status == 'running']
+            used = sum(other.workers for other in running)
+            if len(running) >= self.max_jobs or (running and used + job.workers > self.cpu_budget):
+                return
+            self.queue.pop(0)
+            job.status = 'running'
+            job.started = time.time()
+            threading.Thread(target=self.execute, args=(job,), daemon=True).start()
+
+    def execute(self, job):
+        try:
+            job.run(job)
+            job.status = 'completed'
+            job.progress = 100
+            job.message = 'File recovery completed successfully'
+        except Cancelled:
+            job.status = 'cancelled'
+            job.message = 'Cancelled'
+        except Failed as e:
+            job.status = 'failed'
+            job.message = str(e)
+        except Exception as e:
+            job.status = 'error'
+            job.message = str(e)
+        finally:
+            with self.lock:
+                job.finished = time.time()
+                self.schedule()
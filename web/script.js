@@ -1,6 +1,7 @@
 const API_BASE = 'http://localhost:5000/api';
+const UPLOAD_RETRIES = 5; // failed chunks in a row before an upload gives up
 
-let progressIntervals = {};
+let progressStreams = {};
 let currentSelectedImage = null;
 let currentMode = 'image'; // 'image' or 'device'
 
@@ -92,60 +93,98 @@ function handleFileSelect() {
 }
 
 async function uploadImage(file) {
-    const formData = new FormData();
-    formData.append('file', file);
-
+    // a chunked upload: after a network error (or a reload of the page) it goes on from the last chunk the server has
     try {
         uploadProgress.style.display = 'block';
-        uploadProgressText.textContent = '0%';
+        showUploadProgress(0, file.size);
         uploadProgressMessage.textContent = 'Uploading...';
 
-        const xhr = new XMLHttpRequest();
-
-        xhr.upload.addEventListener('progress', (e) => {
-            if (e.lengthComputable) {
-                const percentComplete = Math.round((e.loaded / e.total) * 100);
-                uploadProgressBar.style.width = `${percentComplete}%`;
-                uploadProgressText.textContent = `${percentComplete}%`;
-                uploadProgressMessage.textContent = `${formatBytes(e.loaded)} / ${formatBytes(e.total)}`;
-            }
+        // the server only gives an upload in progress back to the client that has its id, kept across reloads
+        const key = `upload:${file.name}:${file.size}:${file.lastModified}`;
+        const uploadId = localStorage.getItem(key);
+        const start = (body) => fetch(`${API_BASE}/uploads`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(body)
         });
-
-        xhr.addEventListener('load', () => {
-            if (xhr.status === 200) {
-                const data = JSON.parse(xhr.responseText);
-                if (data.success) {
-                    showToast('Upload completed', 'success');
-                    uploadProgressBar.style.width = '100%';
-                    uploadProgressText.textContent = '100%';
-                    uploadProgressMessage.textContent = 'Complete';
-                    imageFileInput.value = '';
-                    loadImages();
-
-                    setTimeout(() => {
-                        uploadProgress.style.display = 'none';
-                    }, 2000);
-                } else {
-                    showToast(`Error: ${data.error}`, 'error');
+        let response = await start({ filename: file.name, size: file.size, upload_id: uploadId });
+        if (response.status === 404 && uploadId) {
+            localStorage.removeItem(key); // that upload is gone (finalized, aborted), a new one starts
+            response = await start({ filename: file.name, size: file.size });
+        }
+        let data = await response.json();
+        if (!data.success) throw new Error(data.error || 'Upload failed');
+        let upload = data.upload;
+        localStorage.setItem(key, upload.id);
+        let failures = 0;
+        let lost = false;
+
+        while (upload.received < upload.size) {
+            try {
+                if (lost) {
+                    // the server knows what it received, not the browser
+                    upload = (await uploadRequest(`${API_BASE}/uploads/${upload.id}`)).upload;
+                    lost = false;
+                    continue;
+                }
+                const end = Math.min(upload.received + upload.chunk_size, upload.size);
+                const response = await fetch(`${API_BASE}/uploads/${upload.id}?offset=${upload.received}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: file.slice(upload.received, end)
+                });
+                data = await response.json();
+                if (data.upload) upload = data.upload; // a 409 says where the upload goes on from
+                if (upload.status !== 'uploading' || (!response.ok && response.status !== 409)) {
+                    throw new Error(data.error || 'Upload failed');
                 }
-            } else {
-                const data = JSON.parse(xhr.responseText);
-                showToast(`Error: ${data.error || 'Upload failed'}`, 'error');
+                failures = 0;
+            } catch (error) {
+                if (++failures > UPLOAD_RETRIES) throw error;
+                lost = true;
+                await new Promise(resolve => setTimeout(resolve, 1000 * failures));
             }
-        });
+            showUploadProgress(upload.received, upload.size);
+        }
 
-        xhr.addEventListener('error', () => {
-            showToast('Upload failed: Network error', 'error');
+        data = await uploadRequest(`${API_BASE}/uploads/${upload.id}/finalize`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({})
         });
-
-        xhr.open('POST', `${API_BASE}/upload-image`);
-        xhr.send(formData);
+        localStorage.removeItem(key);
+        showToast(`Upload completed, SHA-256 ${data.sha256}`, 'success');
+        uploadProgressBar.style.width = '100%';
+        uploadProgressText.textContent = '100%';
+        uploadProgressMessage.textContent = `Complete - MD5 ${data.md5}`;
+        imageFileInput.value = '';
+        loadImages();
+
+        setTimeout(() => {
+            uploadProgress.style.display = 'none';
+        }, 5000);
 
     } catch (error) {
         showToast(`Failed to upload: ${error.message}`, 'error');
     }
 }
 
+async function uploadRequest(url, options) {
+    const response = await fetch(url, options);
+    const data = await response.json();
+    if (!data.success) {
+        throw new Error(data.error || 'Upload failed');
+    }
+    return data;
+}
+
+function showUploadProgress(received, size) {
+    const percentComplete = size ? Math.floor((received / size) * 100) : 100;
+    uploadProgressBar.style.width = `${percentComplete}%`;
+    uploadProgressText.textContent = `${percentComplete}%`;
+    uploadProgressMessage.textContent = `${formatBytes(received)} / ${formatBytes(size)}`;
+}
+
 async function loadImages() {
     try {
         const response = await fetch(`${API_BASE}/images`);
@@ -330,9 +369,9 @@ async function recoverFiles() {
         const data = await response.json();
 
         if (data.success) {
-            showToast('Recovery started', 'success');
+            showToast(`Recovery queued (job ${data.job_id})`, 'success');
             recoveryProgress.style.display = 'block';
-            startProgressTracking('file_recovery', updateRecoveryProgress);
+            startProgressTracking('file_recovery', `${API_BASE}/jobs/${data.job_id}/stream`, updateRecoveryProgress);
         } else {
             showToast(`Error: ${data.error}`, 'error');
             recoverFilesBtn.disabled = false;
@@ -352,36 +391,39 @@ function updateRecoveryProgress(operation) {
         showToast('Recovery completed!', 'success');
         recoverFilesBtn.disabled = false;
         stopProgressTracking('file_recovery');
-    } else if (operation.status === 'error') {
+    } else if (operation.status === 'error' || operation.status === 'failed') {
         showToast(`Error: ${operation.message}`, 'error');
         recoverFilesBtn.disabled = false;
         stopProgressTracking('file_recovery');
+    } else if (operation.status === 'cancelled') {
+        showToast('Recovery cancelled', 'warning');
+        recoverFilesBtn.disabled = false;
+        stopProgressTracking('file_recovery');
     }
 }
 
-function startProgressTracking(operation, callback) {
-    if (progressIntervals[operation]) {
-        clearInterval(progressIntervals[operation]);
-    }
+function startProgressTracking(operation, url, callback) {
+    stopProgressTracking(operation);
 
-    progressIntervals[operation] = setInterval(async () => {
-        try {
-            const response = await fetch(`${API_BASE}/progress/${operation}`);
-            const data = await response.json();
-
-            if (data.success) {
-                callback(data.operation);
-            }
-        } catch (error) {
-            console.error('Progress tracking error:', error);
+    // the server pushes the state of the job (server-sent events) instead of being polled
+    const source = new EventSource(url);
+    source.onmessage = (event) => {
+        const state = JSON.parse(event.data);
+        callback(state);
+        if (state.status !== 'running' && state.status !== 'queued') {
+            stopProgressTracking(operation);
         }
-    }, 1000);
+    };
+    source.onerror = (error) => {
+        console.error('Progress tracking error:', error);
+    };
+    progressStreams[operation] = source;
 }
 
 function stopProgressTracking(operation) {
-    if (progressIntervals[operation]) {
-        clearInterval(progressIntervals[operation]);
-        delete progressIntervals[operation];
+    if (progressStreams[operation]) {
+        progressStreams[operation].close();
+        delete progressStreams[operation];
     }
 }
 
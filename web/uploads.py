@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+
+CHUNK_SIZE = 8*1024*1024 #what the clients send in one request
+PIECE = 1024*1024 #read from a request, written and hashed at a time
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status #http status of the answer
+
+
+class Upload:
+    # an image uploaded in chunks into <directory>/<id>.part: every chunk is written where it goes and hashed
+    # (sha-256 and md5) as it comes, so what was received is always the beginning of the image and its hashes are
+    # ready when the last byte arrives. A chunk that doesn't start where the last one ended is refused with the offset
+    # to go on from; an interrupted chunk keeps the bytes that were written. expected: the sha-256 the client gave
+    # when it started, the upload can't be finalized with another content
+    def __init__(self, directory, upload_id, filename, size, created=None, expected=None):
+        self.id = upload_id
+        self.filename = filename
+        self.size = size
+        self.created = created or time.time()
+        self.expected = expected.lower() if expected else None
+        self.part_path = os.path.join(directory, upload_id + ".part")
+        self.state_path = os.path.join(directory, upload_id + ".json")
+        self.status = 'uploading'
+        self.received = 0
+        self.hashed = 0 #less than received after a restart, until the part already there is hashed again
+        self.sha256 = hashlib.sha256()
+        self.md5 = hashlib.md5()
+        self.lock = threading.Lock()
+
+    def start(self):
+        open(self.part_path, 'wb').close()
+        with open(self.state_path, 'w') as f:
+            json.dump({'filename': self.filename, 'size': self.size, 'created': self.created, 'sha256': self.expected}, f)
+
+    def catch_up(self, f):
+        # called with the lock held: hashes what was received before a restart, the hash objects died with the server
+        f.seek(self.hashed)
+        while self.hashed < self.received:
+            piece = f.read(min(PIECE, self.received - self.hashed))
+            self.sha256.update(piece)
+            self.md5.update(piece)
+            self.hashed += len(piece)
+
+    def append(self, offset, stream, progress=None):
+        # writes the chunk read from stream at offset, progress(upload) is called as the pieces are written
+        with self.lock:
+            if self.status != 'uploading':
+                raise UploadError(f"The upload is {self.status}", 409)
+            if offset != self.received:
+                raise UploadError(f"The upload goes on from offset {self.received}, not {offset}", 409)
+            with open(self.part_path, 'r+b') as f:
+                self.catch_up(f)
+                f.seek(offset)
+                while True:
+                    piece = stream.read(PIECE)
+                    if not piece:
+                        break
+                    if self.received + len(piece) > self.size:
+                        raise UploadError(f"More than the {self.size} bytes of the image")
+                    f.write(piece)
+                    self.sha256.update(piece)
+                    self.md5.update(piece)
+                    self.received += len(piece)
+                    self.hashed = self.received
+                    if progress is not None:
+                        progress(self)
+
+    def finalize(self, target, sha256=None, md5=None):
+        # moves the complete image to target and returns its hashes, checked against the ones the client sent
+        with self.lock:
+            if self.status != 'uploading':
+                raise UploadError(f"The upload is {self.status}", 409)
+            if self.received != self.size:
+                raise UploadError(f"Only {self.received} of {self.size} bytes received", 409)
+            with open(self.part_path, 'rb') as f:
+                self.catch_up(f)
+            hashes = {'sha256': self.sha256.hexdigest(), 'md5': self.md5.hexdigest()}
+            if self.expected and sha256 and sha256.lower() != self.expected:
+                raise UploadError(f"The upload was started with the sha256 {self.expected}, not {sha256}", 422)
+            for name, expected in (('sha256', sha256 or self.expected), ('md5', md5)):
+                if expected and expected.lower() != hashes[name]:
+                    raise UploadError(f"The {name} of the upload is {hashes[name]}, not {expected}", 422)
+            if os.path.exists(target):
+                raise UploadError(f"File {self.filename} already exists", 409)
+            os.replace(self.part_path, target)
+            os.remove(self.state_path)
+            self.status = 'completed'
+            return hashes
+
+    def abort(self):
+        with self.lock:
+            self.status = 'aborted'
+            for path in (self.part_path, self.state_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'size': self.size,
+            'received': self.received,
+            'progress': round(self.received * 100 / self.size, 1) if self.size else 100.0,
+            'status': self.status,
+            'chunk_size': CHUNK_SIZE,
+            'created': self.created,
+        }
+
+
+class Uploads:
+    # the uploads in progress, kept in directory so an upload cut by a restart of the server goes on where it stopped
+    def __init__(self, directory):
+        self.directory = directory
+        self.uploads = {} #id -> Upload
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".json"):
+                self.load(name[:-len(".json")])
+
+    def load(self, upload_id):
+        upload_path = os.path.join(self.directory, upload_id)
+        try:
+            with open(upload_path + ".json") as f:
+                state = json.load(f)
+            received = os.path.getsize(upload_path + ".part")
+        except (OSError, ValueError):
+            return
+        upload = Upload(self.directory, upload_id, state['filename'], state['size'], state['created'], state.get('sha256'))
+        if received > upload.size:
+            os.truncate(upload_path + ".part", upload.size)
+        upload.received = min(received, upload.size) #the part file only has what was really written
+        self.uploads[upload_id] = upload
+
+    def create(self, filename, size, upload_id=None, sha256=None):
+        # a new upload, or the one in progress the client goes on with: by its id, or by the sha256 it was started with
+        # (a client that lost the id). The same name and size are not enough, two drives of the same model have them
+        with self.lock:
+            if upload_id is not None:
+                upload = self.uploads.get(upload_id)
+                if upload is None or upload.status != 'uploading':
+                    raise UploadError("Upload not found", 404)
+                if upload.filename != filename or upload.size != size:
+                    raise UploadError(f"The upload {upload_id} is not {filename} of {size} bytes", 409)
+                if sha256 and upload.expected and sha256.lower() != upload.expected:
+                    raise UploadError(f"The upload {upload_id} was started with another sha256", 409)
+                return upload
+            for upload in self.uploads.values():
+                if upload.filename == filename and upload.status == 'uploading':
+                    if sha256 and upload.expected == sha256.lower() and upload.size == size:
+                        return upload
+                    raise UploadError(f"File {filename} is already being uploaded, go on with its upload id or abort it", 409)
+            upload = Upload(self.directory, uuid.uuid4().hex[:12], filename, size, expected=sha256)
+            upload.start()
+            self.uploads[upload.id] = upload
+            return upload
+
+    def get(self, upload_id):
+        return self.uploads.get(upload_id)
+
+    def list(self):
+        return list(self.uploads.values())
+
+    def remove(self, upload_id):
+        with self.lock:
+            return self.uploads.pop(upload_id, None)